@@ -0,0 +1,267 @@
+"""
+Benchmarks of integrator throughput and accuracy, headless rendering and initial state generation, with results
+written as JSON so runs on different commits can be compared
+"""
+
+import constants
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+import initial_state
+import julian
+import regression
+from solarsystem import SolarSystem
+
+REFERENCE = dict(integrator="dopri5", integrator_options=dict(atol=1e-16, rtol=1e-13))
+
+
+def create_system(start_date: str, configuration: str, particles=0, seed=0, **options) -> SolarSystem:
+    """
+    System advanced by an integrator, or by the per-planet Runge-Kutta of the given update mode, with test particles
+    on random main belt orbits (which require an integrator)
+    """
+    if configuration in SolarSystem.UPDATE_MODES:
+        system = SolarSystem(start_date, update_mode=configuration, traces=False, keyframe_interval=0)
+    else:
+        system = SolarSystem(start_date, integrator=configuration, traces=False, keyframe_interval=0,
+                             integrator_options=options)
+    if particles:
+        rng = np.random.default_rng(seed)
+        states = initial_state.elements_to_states(rng.uniform(2.1, 3.3, particles), rng.uniform(0, 0.2, particles),
+                                                  rng.uniform(0, 20, particles), *rng.uniform(0, 360, (3, particles)))
+        system.add_particles(states[:, :3], states[:, 3:])
+    return system
+
+
+def energy(system: SolarSystem) -> float:
+    """ Kinetic plus potential energy of the planets, which is conserved since the Sun stays fixed """
+    n = len(system.planets) + 1
+    x, v, m = system.positions[:n, :3], system.velocities[1:n, :3], system.masses[:n]
+    dx = x[:, np.newaxis] - x[np.newaxis]
+    r = np.sqrt(np.einsum('ijk,ijk->ij', dx, dx))
+    i, j = np.triu_indices(n, 1)
+    return 0.5 * np.sum(m[1:] * np.einsum('ij,ij->i', v, v)) - constants.GRAV_CONSTANT * np.sum(m[i] * m[j] / r[i, j])
+
+
+def interactions_per_step(system: SolarSystem, force_evaluations: float) -> float:
+    """ Body-pair interactions computed per step """
+    if system.integrator is None:
+        return 4 * len(system.planets) ** 2  # four stages, each planet against the other planets and the Sun
+    n = system.integrator.n_massive
+    return force_evaluations * (n * (n - 1) + (len(system.positions) - n) * n)
+
+
+def bench_integrator(configuration: str, start_date="2000-01-01", days=3650, dt=24, particles=0, reference=None,
+                     **options) -> dict:
+    """
+    Throughput, memory and accuracy of a configuration over the given number of days. The position error is the
+    largest planet deviation from the reference system (REFERENCE by default) at the end of the run.
+    """
+    steps = days * 24 // dt
+    system = create_system(start_date, configuration, particles, **options)
+    energy_start = energy(system)
+
+    # Allocations are traced in a short separate run, tracing would distort the timings. The probe is warmed up
+    # first, so that one-off costs such as compiling kernels aren't counted as allocations of a step.
+    allocated = regression.step_allocations(create_system(start_date, configuration, particles, **options),
+                                            steps=10, dt=dt)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        system.update_rk(dt=dt)
+    elapsed = time.perf_counter() - start
+
+    reference = reference or create_system(start_date, REFERENCE["integrator"], **REFERENCE["integrator_options"])
+    while reference.hours < system.hours:
+        reference.update_rk(dt=dt)
+    n = len(system.planets) + 1
+    evaluations = system.integrator.force_evaluations / steps if system.integrator is not None else 4
+    return {
+        "benchmark": "integrator",
+        "configuration": configuration,
+        "options": options,
+        "particles": particles,
+        "days": days,
+        "dt": dt,
+        "steps": steps,
+        "seconds": elapsed,
+        "steps_per_second": steps / elapsed,
+        "force_evaluations_per_step": evaluations,
+        "ns_per_interaction": elapsed / steps / interactions_per_step(system, evaluations) * 1e9,
+        "peak_step_allocations_bytes": allocated,
+        "relative_energy_drift": abs(energy(system) / energy_start - 1),
+        "max_position_error_au": float(np.max(np.linalg.norm(
+            system.positions[1:n, :3] - reference.positions[1:n, :3], axis=1)))
+    }
+
+
+def bench_renderer(frames=200, size=(1000, 800), trace_scale=1.0, start_date="2000-01-01") -> dict:
+    """ Frame time of rendering to an off-screen surface, with traces filled to trace_scale times their default """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+    import pygame
+    pygame.init()
+    pygame.display.set_mode(size)
+    from renderer import Renderer
+
+    system = SolarSystem(start_date, keyframe_interval=0)
+    for i, planet in enumerate(system.planets):
+        planet.max_trace_len = max(2, int(planet.max_trace_len * trace_scale))
+        every = max(1, i - 2)
+        dates = system.julian_date() - every * np.arange(planet.max_trace_len - 1, -1, -1)
+        states = initial_state.load_states(dates, planets=[i])[:, 0]
+        planet.trace.load(np.column_stack((states[:, :3], np.ones(len(states)))))
+    renderer = Renderer()
+
+    renderer.render(system, size)
+    start = time.perf_counter()
+    for _ in range(frames):
+        renderer.render(system, size)
+    elapsed = time.perf_counter() - start
+    pygame.quit()
+    return {
+        "benchmark": "renderer",
+        "frames": frames,
+        "size": list(size),
+        "trace_points": sum(len(planet.trace) for planet in system.planets),
+        "seconds": elapsed,
+        "frames_per_second": frames / elapsed,
+        "ms_per_frame": elapsed / frames * 1e3
+    }
+
+
+def bench_initial_state(dates=10000, repeat=20) -> dict:
+    """ Time of the initial state of a single date and per date when many dates are evaluated at once """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        initial_state.load_states(julian.julian_date(2000, 1, 1))
+    single = (time.perf_counter() - start) / repeat
+    julian_dates = julian.julian_date(2000, 1, 1) + np.arange(dates)
+    start = time.perf_counter()
+    initial_state.load_states(julian_dates)
+    batch = time.perf_counter() - start
+    return {
+        "benchmark": "initial_state",
+        "dates": dates,
+        "ms_single_date": single * 1e3,
+        "us_per_date_batched": batch / dates * 1e6
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor()
+    }
+
+
+def result_key(result: dict) -> tuple:
+    """ Parameters identifying a result, used to match results of different runs """
+    return tuple((name, json.dumps(value, sort_keys=True)) for name, value in sorted(result.items())
+                 if name in ("benchmark", "configuration", "options", "particles", "days", "dt", "frames", "size",
+                             "trace_points", "dates"))
+
+
+def compare(previous: dict, current: dict):
+    """ Print the change of every timing and accuracy metric between two result files """
+    metrics = ["steps_per_second", "ns_per_interaction", "peak_step_allocations_bytes", "relative_energy_drift",
+               "max_position_error_au", "frames_per_second", "ms_per_frame", "ms_single_date", "us_per_date_batched"]
+    old = {result_key(result): result for result in previous["results"]}
+    print(f"{previous['environment']['commit']} -> {current['environment']['commit']}")
+    for result in current["results"]:
+        if result_key(result) not in old:
+            continue
+        name = " ".join(str(result[key]) for key in ("benchmark", "configuration", "particles") if key in result)
+        for metric in metrics:
+            if metric in result and old[result_key(result)].get(metric):
+                before, after = old[result_key(result)][metric], result[metric]
+                print(f"    {name:>32} {metric:>28}: {before:.4g} -> {after:.4g} ({after / before:.2f}x)")
+
+
+def main():
+    configurations = ["sequential", "rk4", "leapfrog", "wh"]
+    particles = [0]
+    days = 3650
+    dt = 24
+    frames = 200
+    size = (1000, 800)
+    trace_scale = 1.0
+    output = None
+    previous = None
+    skip = set()
+
+    for i in sys.argv[1:]:
+        arg, *val = i.split("=")
+        if arg == "--integrators":
+            configurations = val[0].split(",")
+        if arg == "--particles":
+            particles = [int(n) for n in val[0].split(",")]
+        if arg == "--days":
+            days = int(val[0])
+        if arg == "--dt":
+            dt = int(val[0])
+        if arg == "--frames":
+            frames = int(val[0])
+        if arg == "--size":
+            size = tuple(int(n) for n in val[0].split("x"))
+        if arg == "--trace-scale":
+            trace_scale = float(val[0])
+        if arg == "--output":
+            output = val[0]
+        if arg == "--compare":
+            previous = val[0]
+        if arg == "--skip":
+            skip = set(val[0].split(","))
+
+    results = []
+    if "integrators" not in skip:
+        reference = create_system("2000-01-01", REFERENCE["integrator"], **REFERENCE["integrator_options"])
+        for configuration in configurations:
+            for n in particles:
+                if n and configuration in SolarSystem.UPDATE_MODES:
+                    continue
+                results.append(bench_integrator(configuration, days=days, dt=dt, particles=n, reference=reference))
+                print(f"{configuration:>12} N={n:<7} {results[-1]['steps_per_second']:10.1f} steps/s "
+                      f"{results[-1]['ns_per_interaction']:8.1f} ns/interaction "
+                      f"energy drift {results[-1]['relative_energy_drift']:.2e} "
+                      f"position error {results[-1]['max_position_error_au']:.2e} AU", file=sys.stderr)
+    if "renderer" not in skip:
+        results.append(bench_renderer(frames, size, trace_scale))
+        print(f"    renderer {results[-1]['frames_per_second']:.1f} frames/s", file=sys.stderr)
+    if "initial_state" not in skip:
+        results.append(bench_initial_state())
+        print(f"initial state {results[-1]['ms_single_date']:.3f} ms", file=sys.stderr)
+
+    report = {
+        "environment": environment(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results
+    }
+    if output:
+        if os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if previous:
+        with open(previous, "r") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
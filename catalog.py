@@ -0,0 +1,98 @@
+"""
+Bulk loading of small-body orbital element catalogs as test particle state vectors, with an on-disk cache
+"""
+
+import constants
+import csv
+import hashlib
+import os
+import numpy as np
+import numpy.typing as npt
+import initial_state
+import julian
+
+MU = constants.GRAV_CONSTANT * constants.sun_mass
+
+
+def unpack_epoch(packed: str) -> float:
+    """ Julian date (0h TT) of an epoch in MPC packed form, e.g. K24AH is 2024-10-17 """
+    digit = lambda c: int(c) if c.isdigit() else ord(c) - ord('A') + 10
+    year = (ord(packed[0]) - ord('A') + 10) * 100 + int(packed[1:3])
+    return julian.julian_date(year, digit(packed[3]), digit(packed[4]))
+
+
+def read_mpcorb(path: str) -> tuple[list[str], dict]:
+    """ Elements from a file in the MPCORB.DAT fixed-width format, lines that don't hold elements are skipped """
+    lines = []
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            if len(line) >= 103 and line[20:25].strip() and line[92:103].strip().replace('.', '', 1).isdigit():
+                lines.append(line)
+    names = [(line[166:194].strip() if len(line) > 166 else "") or line[0:7].strip() for line in lines]
+    column = lambda start, end: np.array([float(line[start:end]) for line in lines])
+    return names, {
+        "epoch": np.array([unpack_epoch(line[20:25]) for line in lines]),
+        "M": column(26, 35),
+        "peri": column(37, 46),
+        "node": column(48, 57),
+        "i": column(59, 68),
+        "e": column(70, 79),
+        "a": column(92, 103)
+    }
+
+
+def read_csv(path: str) -> tuple[list[str], dict]:
+    """ Elements from a JPL small-body database style CSV with columns epoch (JD), a, e, i, om, w and ma """
+    with open(path, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+    name_column = next((c for c in ("full_name", "name", "pdes", "spkid") if rows and c in rows[0]), None)
+    column = lambda name: np.array([float(row[name]) for row in rows])
+    names = [row[name_column].strip() if name_column else str(k) for k, row in enumerate(rows)]
+    return names, {
+        "epoch": column("epoch"),
+        "M": column("ma"),
+        "peri": column("w"),
+        "node": column("om"),
+        "i": column("i"),
+        "e": column("e"),
+        "a": column("a")
+    }
+
+
+def catalog_states(elements: dict, julian_date: float) -> npt.NDArray[float]:
+    """ States (n, 6) at the given Julian date, mean anomalies propagated from each object's own epoch """
+    n = np.sqrt(MU / elements["a"] ** 3) / np.pi * 180  # mean motion in degrees per day
+    M = (elements["M"] + n * (julian_date - elements["epoch"])) % 360
+    return initial_state.elements_to_states(elements["a"], elements["e"], elements["i"], elements["node"],
+                                            elements["peri"], M)
+
+
+def load_catalog(path: str, julian_date: float, cache_dir="cache/catalog") -> tuple[list[str], npt.NDArray[float]]:
+    """
+    Names and heliocentric states (n, 6) of all bound objects in an element catalog (MPCORB.DAT or CSV) at
+    the given Julian date. Results are cached keyed by the catalog's content hash and the date.
+    """
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    cache = os.path.join(cache_dir, f"{digest}_{julian_date:.6f}.npz")
+    if os.path.exists(cache):
+        with np.load(cache) as data:
+            return data["names"].tolist(), data["states"]
+
+    names, elements = read_csv(path) if path.lower().endswith(".csv") else read_mpcorb(path)
+    bound = (elements["e"] < 1) & (elements["a"] > 0)
+    if not np.all(bound):
+        print(f"Skipping {np.count_nonzero(~bound)} objects on unbound orbits")
+    elements = {key: value[bound] for key, value in elements.items()}
+    names = [name for name, keep in zip(names, bound) if keep]
+    states = catalog_states(elements, julian_date)
+    converged = np.all(np.isfinite(states), axis=1)
+    if not np.all(converged):
+        print(f"Skipping {np.count_nonzero(~converged)} objects for which Kepler's equation did not converge")
+    states = states[converged]
+    names = [name for name, keep in zip(names, converged) if keep]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache, "wb") as f:
+        np.savez(f, names=np.array(names), states=states)
+    return names, states
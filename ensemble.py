@@ -0,0 +1,61 @@
+"""
+Ensembles of perturbed Solar systems advanced together in (M, N, 3) state arrays
+"""
+
+import numpy as np
+import numpy.typing as npt
+import integrator as integrators
+from solarsystem import SolarSystem
+
+
+class Ensemble:
+    """
+    M copies of the Solar system whose initial planet positions (AU), velocities (AU/day) and masses (relative)
+    are perturbed with Gaussian noise of the given standard deviations. Member 0 keeps the nominal state.
+    All members are advanced by a single vectorized integrator; the Sun is fixed at the origin in all of them.
+    """
+
+    def __init__(self, start_date: str, members: int, position_sigma=0.0, velocity_sigma=0.0, mass_sigma=0.0,
+                 integrator="rk4", seed=None, use_horizons=False, integrator_options=None):
+        nominal = SolarSystem(start_date=start_date, use_horizons=use_horizons, traces=False)
+        self.names = [planet.name for planet in nominal.planets]
+        self.start_julian_date = nominal.start_julian_date
+        self.hours = 0
+
+        rng = np.random.default_rng(seed)
+        shape = (members,) + nominal.positions[:, :3].shape
+        self.positions = np.broadcast_to(nominal.positions[:, :3], shape).copy()
+        self.velocities = np.broadcast_to(nominal.velocities[:, :3], shape).copy()
+        self.masses = np.broadcast_to(nominal.masses, shape[:2]).copy()
+        self.positions[1:, 1:] += rng.normal(scale=position_sigma, size=(members - 1, shape[1] - 1, 3))
+        self.velocities[1:, 1:] += rng.normal(scale=velocity_sigma, size=(members - 1, shape[1] - 1, 3))
+        self.masses[1:, 1:] *= 1 + rng.normal(scale=mass_sigma, size=(members - 1, shape[1] - 1))
+
+        fixed = np.arange(shape[1]) == 0
+        self.integrator = integrators.create_integrator(integrator, self.masses, fixed, **(integrator_options or {}))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def update(self, dt=24):
+        """ Advance all members by dt hours """
+        self.integrator.step(self.positions, self.velocities, dt / 24)
+        self.hours += dt
+
+    def julian_date(self) -> float:
+        return self.start_julian_date + self.hours / 24
+
+    def run(self, steps: int, dt=24, every=1, summary=False) -> npt.NDArray[float]:
+        """
+        Take the given number of steps, recording a snapshot of the planets every `every` steps (including
+        the initial state). Returns (T, M, 9, 6) positions and velocities of every member, or with summary
+        (T, 2, 9, 6) mean and standard deviation over members.
+        """
+        snapshots = []
+        for step in range(steps + 1):
+            if step % every == 0:
+                state = np.concatenate((self.positions[:, 1:], self.velocities[:, 1:]), axis=-1)
+                snapshots.append(np.stack((state.mean(axis=0), state.std(axis=0))) if summary else state)
+            if step < steps:
+                self.update(dt)
+        return np.array(snapshots)
@@ -0,0 +1,161 @@
+"""
+Gravitational force models acting on whole-system state arrays
+"""
+
+import constants
+import numpy as np
+import numpy.typing as npt
+
+
+def direct_accelerations(positions: npt.NDArray[float], masses: npt.NDArray[float]) -> npt.NDArray[float]:
+    """
+    Accelerations of all bodies by direct pairwise summation. Positions are (..., N, 3) and masses (..., N),
+    leading dimensions index independent systems (e.g. ensemble members).
+    """
+    dx = positions[..., np.newaxis, :, :] - positions[..., :, np.newaxis, :]  # dx[i, j] points from body i to j
+    dsq = np.einsum('...ijk,...ijk->...ij', dx, dx)
+    diagonal = np.arange(positions.shape[-2])
+    dsq[..., diagonal, diagonal] = np.inf
+    factor = constants.GRAV_CONSTANT * masses[..., np.newaxis, :] / (dsq * np.sqrt(dsq))
+    return np.einsum('...ij,...ijk->...ik', factor, dx)
+
+
+def field_accelerations(targets, sources, masses) -> npt.NDArray[float]:
+    """ Accelerations of massless targets (..., M, 3) caused by sources (..., N, 3) of masses (..., N), O(N * M) """
+    dx = sources[..., np.newaxis, :, :] - targets[..., :, np.newaxis, :]
+    dsq = np.einsum('...ijk,...ijk->...ij', dx, dx)
+    factor = constants.GRAV_CONSTANT * masses[..., np.newaxis, :] / (dsq * np.sqrt(dsq))
+    return np.einsum('...ij,...ijk->...ik', factor, dx)
+
+
+class BarnesHut:
+    """
+    Barnes-Hut approximation of the gravitational accelerations, O(N log N). The octree is built level by level
+    from Morton keys, and all bodies walk it together: every iteration either accepts a (body, node) pair as a
+    point mass, when the node's size / distance is below the opening angle theta, or replaces it by the node's
+    children. Cells at the deepest level that hold several bodies (such as a planet and its moons) are buckets,
+    whose members are summed directly, excluding each body itself.
+    """
+    name = "barnes-hut"
+
+    def __init__(self, theta=0.5, depth=16):
+        self.theta = theta
+        self.depth = depth
+
+    def __call__(self, positions, masses):
+        if positions.ndim > 2:
+            masses = np.broadcast_to(masses, positions.shape[:-1])
+            return np.array([self(p, m) for p, m in zip(positions, masses)])
+        return self.accelerations(np.asarray(positions, dtype=float), np.asarray(masses, dtype=float))
+
+    def build(self, positions, masses):
+        """ Flat octree: per-node prefix, level, cell size, mass, center of mass, body count and children range """
+        low = positions.min(axis=0)
+        size = max(np.max(positions.max(axis=0) - low), 1e-300) * (1 + 1e-9)
+        cells = ((positions - low) / size * (1 << self.depth)).astype(np.int64)
+        keys = np.zeros(len(positions), dtype=np.int64)
+        for bit in range(self.depth):
+            for axis in range(3):
+                keys |= ((cells[:, axis] >> bit) & 1) << (3 * bit + axis)
+
+        levels = []
+        for level in range(self.depth + 1):
+            prefixes, inverse = np.unique(keys >> (3 * (self.depth - level)), return_inverse=True)
+            mass = np.bincount(inverse, masses, len(prefixes))
+            weights = np.where(mass > 0, mass, 1)
+            center = np.column_stack([np.bincount(inverse, masses * positions[:, k], len(prefixes)) for k in range(3)])
+            center /= weights[:, np.newaxis]
+            count = np.bincount(inverse, minlength=len(prefixes))
+            levels.append((prefixes, mass, center, count, inverse))
+            if np.all(count == 1):
+                break
+
+        offsets = np.cumsum([0] + [len(level[0]) for level in levels])
+        tree = {
+            "prefix": np.concatenate([level[0] for level in levels]),
+            "level": np.concatenate([np.full(len(level[0]), k) for k, level in enumerate(levels)]),
+            "mass": np.concatenate([level[1] for level in levels]),
+            "center": np.concatenate([level[2] for level in levels]),
+            "count": np.concatenate([level[3] for level in levels]),
+            "keys": keys
+        }
+        tree["size"] = size / 2.0 ** tree["level"]
+        tree["leaf"] = (tree["count"] == 1) | (tree["level"] == len(levels) - 1)
+        child_start = np.zeros(offsets[-1], dtype=np.int64)
+        child_end = np.zeros(offsets[-1], dtype=np.int64)
+        for k in range(len(levels) - 1):
+            parents = levels[k + 1][0] >> 3
+            child_start[offsets[k]:offsets[k + 1]] = offsets[k + 1] + np.searchsorted(parents, levels[k][0], "left")
+            child_end[offsets[k]:offsets[k + 1]] = offsets[k + 1] + np.searchsorted(parents, levels[k][0], "right")
+        tree["child_start"], tree["child_end"] = child_start, child_end
+        # Bodies of the deepest level's cells, contiguous per cell, for direct summation within buckets
+        tree["members"] = np.argsort(levels[-1][4], kind="stable")
+        tree["member_start"] = np.zeros(offsets[-1], dtype=np.int64)
+        tree["member_start"][offsets[-2]:] = np.cumsum(levels[-1][3]) - levels[-1][3]
+        return tree
+
+    def accelerations(self, positions, masses):
+        tree = self.build(positions, masses)
+        a = np.zeros_like(positions)
+        bodies = np.arange(len(positions))
+        nodes = np.zeros(len(positions), dtype=np.int64)
+        theta_sq = self.theta ** 2
+
+        while len(bodies):
+            level = tree["level"][nodes]
+            inside = (tree["keys"][bodies] >> (3 * (self.depth - level))) == tree["prefix"][nodes]
+            dx = tree["center"][nodes] - positions[bodies]
+            dsq = np.einsum('ij,ij->i', dx, dx)
+            leaf = tree["leaf"][nodes]
+            far = ~inside & (tree["size"][nodes] ** 2 < theta_sq * dsq)
+            bucket = leaf & (tree["count"][nodes] > 1) & (inside | ~far)
+            accept = ~inside & (leaf | far) & ~bucket & (tree["mass"][nodes] > 0)
+            expand = ~leaf & (inside | ~far)
+
+            factor = constants.GRAV_CONSTANT * tree["mass"][nodes[accept]] / (dsq[accept] * np.sqrt(dsq[accept]))
+            for k in range(3):
+                a[:, k] += np.bincount(bodies[accept], factor * dx[accept, k], len(positions))
+
+            counts = tree["count"][nodes[bucket]]
+            targets = np.repeat(bodies[bucket], counts)
+            sources = tree["members"][np.repeat(tree["member_start"][nodes[bucket]] - np.cumsum(counts) + counts,
+                                                counts) + np.arange(counts.sum())]
+            targets, sources = targets[targets != sources], sources[targets != sources]
+            dx = positions[sources] - positions[targets]
+            dsq = np.einsum('ij,ij->i', dx, dx)
+            factor = constants.GRAV_CONSTANT * masses[sources] / (dsq * np.sqrt(dsq))
+            for k in range(3):
+                a[:, k] += np.bincount(targets, factor * dx[:, k], len(positions))
+
+            start, end = tree["child_start"][nodes[expand]], tree["child_end"][nodes[expand]]
+            counts = end - start
+            bodies = np.repeat(bodies[expand], counts)
+            nodes = np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return a
+
+
+def jit_accelerations(positions: npt.NDArray[float], masses: npt.NDArray[float]) -> npt.NDArray[float]:
+    """ Direct summation by the compiled kernel (see kernels.py), batched positions fall back to NumPy """
+    import kernels
+    if positions.ndim != 2:
+        return direct_accelerations(positions, masses)
+    return kernels.accelerations(positions, masses, len(masses), np.zeros(len(masses), dtype=bool),
+                                 np.empty_like(positions))
+
+
+FORCES = {"direct": direct_accelerations, "barnes-hut": BarnesHut, "jit": jit_accelerations}
+
+
+def create_force(name: str, **options):
+    """ Force backend by name, options (such as theta) are passed to backends that are classes """
+    if name not in FORCES:
+        raise ValueError(f"Unknown force backend '{name}', expected one of: {', '.join(FORCES)}")
+    return FORCES[name](**options) if isinstance(FORCES[name], type) else FORCES[name]
+
+
+def force_accuracy(force, positions, masses) -> dict:
+    """ Relative error of a force backend's accelerations against direct summation """
+    exact = direct_accelerations(positions, masses)
+    scale = np.maximum(np.linalg.norm(exact, axis=-1), 1e-300)
+    error = np.linalg.norm(force(positions, masses) - exact, axis=-1) / scale
+    return {"max": float(error.max()), "mean": float(error.mean()), "rms": float(np.sqrt(np.mean(error ** 2)))}
@@ -72,3 +72,13 @@ def perspective_divide(point):
         point[0] / point[3],
         -point[1] / point[3]
     ])
+
+
+def project(points, mvp, size):
+    """ Viewport coordinates of an (n, 4) array of homogeneous points, transformed and divided in one pass """
+    clip = np.matmul(points, mvp)
+    screen = clip[:, :2] / clip[:, 3:]
+    screen[:, 1] *= -1
+    screen += 1
+    screen *= (size[0] // 2, size[1] // 2)
+    return screen
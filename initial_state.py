@@ -1,107 +1,139 @@
 import constants
-import math
+import julian
+import numpy as np
+import numpy.typing as npt
 
+DEG_FROM_RAD = 180.0 / np.pi
+RAD_FROM_DEG = np.pi / 180.0
 
-class OrbitalElements:
-    def __init__(self, N, i, w1, a, e, L):
-        self.N = N  # longitude of the ascending node
-        self.i = i  # inclination to the ecliptic
-        self.w1 = w1  # longitude of perihelion
-        self.a = a  # semi-major axis, or mean distance from Sun
-        self.e = e  # eccentricity
-        self.L = L  # mean longitude
+ELEMENT_NAMES = ['N', 'i', 'w1', 'a', 'e', 'L']
 
 
-class Angle:
-    DEG_FROM_RAD = 180.0 / math.pi
-    RAD_FROM_DEG = math.pi / 180.0
+def element_table(elements: list[dict]) -> npt.NDArray[float]:
+    """ (2, 9, 6) array of base values and rates per century of the elements in ELEMENT_NAMES order """
+    return np.array([[[planet[name][k] for name in ELEMENT_NAMES] for planet in elements] for k in range(2)])
 
-    @classmethod
-    def cos_deg(cls, degrees):
-        return math.cos(cls.RAD_FROM_DEG * degrees)
 
-    @classmethod
-    def sin_deg(cls, degrees):
-        return math.sin(cls.RAD_FROM_DEG * degrees)
+ELEMENTS_1800_2050 = element_table(constants.keplerian_elements_1800_2050)
+ELEMENTS_3000_3000 = element_table(constants.keplerian_elements_3000_3000)
 
-    @classmethod
-    def atan2_deg(cls, y, x):
-        return cls.DEG_FROM_RAD * math.atan2(y, x)
+# Additional terms of M, zero for the inner planets
+B = np.array([0, 0, 0, 0] + constants.b)
+C = np.array([0, 0, 0, 0] + constants.c)
+S = np.array([0, 0, 0, 0] + constants.s)
+F = np.array([0, 0, 0, 0] + constants.f)
 
+MU = constants.GRAV_CONSTANT * (constants.sun_mass + np.array(constants.planets_mass))
 
-def load_data(start_date: str) -> list[dict]:
-    y, m, d = [int(i) for i in start_date.split("-")]
-    day = (367 * y - 7 * (y + (m + 9) // 12) // 4
-           - 3 * ((y + (m - 9) // 7) // 100 + 1) // 4 + 275 * m // 9 + d + 1721029)  # Julian Ephemeris Date
 
-    T = (day - 2451545.0) / 36525
+MODERN_ELEMENTS_START = julian.julian_date(1800, 1, 1)
+MODERN_ELEMENTS_END = julian.julian_date(2051, 1, 1)
 
-    if 2378497 <= day <= 2469808:
-        elements = constants.keplerian_elements_1800_2050
+
+def uses_modern_elements(julian_dates):
+    """ Whether the 1800 AD - 2050 AD elements are valid for the given dates """
+    return (MODERN_ELEMENTS_START <= julian_dates) & (julian_dates < MODERN_ELEMENTS_END)
+
+
+def load_states(julian_dates, tolerance=1e-12, max_iterations=50, planets=slice(None)) -> npt.NDArray[float]:
+    """
+    Heliocentric positions and velocities of the 9 planets computed from Keplerian elements for an array of
+    Julian dates. Returns an (n_dates, 9, 6) array, Kepler's equation is solved for all dates and planets at once.
+    Passing a list of planet indices restricts the computation (and the second axis of the result) to them.
+    """
+    jd = np.atleast_1d(np.asarray(julian_dates, dtype=float))
+    T = (jd - 2451545.0)[:, np.newaxis] / 36525
+
+    table = np.where(uses_modern_elements(jd)[:, np.newaxis, np.newaxis, np.newaxis],
+                     ELEMENTS_1800_2050[:, planets], ELEMENTS_3000_3000[:, planets])
+    N, i, w1, a, e, L = np.moveaxis(table[:, 0] + T[:, :, np.newaxis] * table[:, 1], -1, 0)  # each (n_dates, n)
+
+    w = w1 - N
+    M = L - w1 + B[planets] * T ** 2 + C[planets] * np.cos(F[planets] * T) + S[planets] * np.sin(F[planets] * T)
+    M %= 360
+
+    e1 = e * DEG_FROM_RAD
+    E = np.where(e > 0.8, 180.0, M + e1 * np.sin(RAD_FROM_DEG * M))  # see elements_to_states
+    for _ in range(max_iterations):
+        E1 = (M - (E - e1 * np.sin(RAD_FROM_DEG * E))) / (1 - e * np.cos(RAD_FROM_DEG * E))
+        E += E1
+        if np.all(np.abs(E1) < tolerance):
+            break
+    else:
+        if np.any(np.abs(M - (E - e1 * np.sin(RAD_FROM_DEG * E))) > tolerance):
+            raise ValueError(f"Kepler's equation did not converge in {max_iterations} iterations")
+
+    sin_E, cos_E = np.sin(RAD_FROM_DEG * E), np.cos(RAD_FROM_DEG * E)
+    c1 = a * (cos_E - e)
+    c2 = a * (np.sqrt(1.0 - e ** 2) * sin_E)
+    r = np.sqrt(c1 ** 2 + c2 ** 2)
+
+    cos_w, sin_w = np.cos(RAD_FROM_DEG * w), np.sin(RAD_FROM_DEG * w)
+    cos_N, sin_N = np.cos(RAD_FROM_DEG * N), np.sin(RAD_FROM_DEG * N)
+    cos_i, sin_i = np.cos(RAD_FROM_DEG * i), np.sin(RAD_FROM_DEG * i)
+
+    states = np.empty(a.shape + (6,))
+    states[..., 0] = c1 * (cos_w * cos_N - sin_w * sin_N * cos_i) + c2 * (-sin_w * cos_N - cos_w * sin_N * cos_i)
+    states[..., 1] = c1 * (cos_w * sin_N + sin_w * cos_N * cos_i) + c2 * (-sin_w * sin_N + cos_w * cos_N * cos_i)
+    states[..., 2] = c1 * sin_w * sin_i + c2 * cos_w * sin_i
+
+    c1 = -sin_E * np.sqrt(MU[planets] * a) / r
+    c2 = np.sqrt(1 - e ** 2) * cos_E * np.sqrt(MU[planets] * a) / r
+
+    states[..., 3] = c1 * (cos_w * cos_N - sin_w * sin_N * cos_i) - c2 * (sin_w * cos_N + cos_w * sin_N * cos_i)
+    states[..., 4] = c1 * (cos_w * sin_N + sin_w * cos_N * cos_i) + c2 * (cos_w * cos_N * cos_i - sin_w * sin_N)
+    states[..., 5] = c1 * sin_w * sin_i + c2 * cos_w * sin_i
+
+    return states
+
+
+def elements_to_states(a, e, i, node, peri, M, mu=constants.GRAV_CONSTANT * constants.sun_mass, tolerance=1e-12,
+                       max_iterations=50) -> npt.NDArray[float]:
+    """
+    Heliocentric positions and velocities, (n, 6), of bound orbits given as arrays of semi-major axis (AU),
+    eccentricity, inclination, longitude of the ascending node, argument of perihelion and mean anomaly (degrees).
+    Rows for which Kepler's equation has not converged after max_iterations are NaN.
+    """
+    i, node, peri, M = [RAD_FROM_DEG * np.asarray(angle, dtype=float) for angle in (i, node, peri, M)]
+    a, e = np.asarray(a, dtype=float), np.asarray(e, dtype=float)
+    M = M % (2 * np.pi)
+
+    # Newton's method always converges from E = pi for M in [0, 2 pi), the usual guess fails near e = 1
+    E = np.where(e > 0.8, np.pi, M + e * np.sin(M))
+    for _ in range(max_iterations):
+        E1 = (M - (E - e * np.sin(E))) / (1 - e * np.cos(E))
+        E += E1
+        if np.all(np.abs(E1) < tolerance):
+            break
+    # judged by the residual, as rounding keeps the corrections from getting much below 1e-16 / (1 - e)
+    E = np.where(np.abs(M - (E - e * np.sin(E))) < tolerance, E, np.nan)
+
+    # Position and velocity in the orbital plane, then rotated into the ecliptic frame
+    c1 = a * (np.cos(E) - e)
+    c2 = a * np.sqrt(1 - e ** 2) * np.sin(E)
+    r = np.sqrt(c1 ** 2 + c2 ** 2)
+    v1 = -np.sqrt(mu * a) / r * np.sin(E)
+    v2 = np.sqrt(mu * a) / r * np.sqrt(1 - e ** 2) * np.cos(E)
+
+    cos_w, sin_w = np.cos(peri), np.sin(peri)
+    cos_N, sin_N = np.cos(node), np.sin(node)
+    cos_i, sin_i = np.cos(i), np.sin(i)
+    p = np.stack((cos_w * cos_N - sin_w * sin_N * cos_i, cos_w * sin_N + sin_w * cos_N * cos_i, sin_w * sin_i), -1)
+    q = np.stack((-sin_w * cos_N - cos_w * sin_N * cos_i, -sin_w * sin_N + cos_w * cos_N * cos_i, cos_w * sin_i), -1)
+
+    return np.concatenate((c1[..., np.newaxis] * p + c2[..., np.newaxis] * q,
+                           v1[..., np.newaxis] * p + v2[..., np.newaxis] * q), axis=-1)
+
+
+def load_data(julian_date: float) -> list[dict]:
+    if uses_modern_elements(julian_date):
         print("Using Keplerian elements for time-interval 1800 AD - 2050 AD")
     else:
-        elements = constants.keplerian_elements_3000_3000
         print("Using Keplerian elements for time-interval 3000 BC – 3000 AD")
 
-    planets_elements = []
-    for i in range(9):
-        planets_elements.append(OrbitalElements(
-            N=elements[i]['N'][0] + T * elements[i]['N'][1],
-            i=elements[i]['i'][0] + T * elements[i]['i'][1],
-            w1=elements[i]['w1'][0] + T * elements[i]['w1'][1],
-            a=elements[i]['a'][0] + T * elements[i]['a'][1],
-            e=elements[i]['e'][0] + T * elements[i]['e'][1],
-            L=elements[i]['L'][0] + T * elements[i]['L'][1]
-        ))
-
-    planets = [{"name": constants.planets_names[i]} for i in range(9)]
-
-    for i in range(9):
-        w = planets_elements[i].w1 - planets_elements[i].N
-        M = planets_elements[i].L - planets_elements[i].w1
-        if i in range(4, 9):
-            M += (constants.b[i - 4] * (T ** 2) + constants.c[i - 4] * math.cos(constants.f[i - 4] * T)
-                  + constants.s[i - 4] * math.sin(constants.f[i - 4] * T))
-        M %= 360
-
-        e = planets_elements[i].e
-        e1 = e * Angle.DEG_FROM_RAD
-
-        E = M + e1 * Angle.sin_deg(M)
-        while True:
-            M1 = M - (E - e1 * Angle.sin_deg(E))
-            E1 = M1 / (1 - e * Angle.cos_deg(E))
-            E += E1
-            if E1 < 1e-9:
-                break
-
-        a = planets_elements[i].a
-        c1 = a * (Angle.cos_deg(E) - e)
-        c2 = a * (math.sqrt(1.0 - e ** 2) * Angle.sin_deg(E))
-        r = math.sqrt(c1 ** 2 + c2 ** 2)
-
-        cos_w = Angle.cos_deg(w)
-        sin_w = Angle.sin_deg(w)
-        cos_N = Angle.cos_deg(planets_elements[i].N)
-        sin_N = Angle.sin_deg(planets_elements[i].N)
-        cos_i = Angle.cos_deg(planets_elements[i].i)
-        sin_i = Angle.sin_deg(planets_elements[i].i)
-
-        x = c1 * (cos_w * cos_N - sin_w * sin_N * cos_i) + c2 * (-sin_w * cos_N - cos_w * sin_N * cos_i)
-        y = c1 * (cos_w * sin_N + sin_w * cos_N * cos_i) + c2 * (-sin_w * sin_N + cos_w * cos_N * cos_i)
-        z = c1 * sin_w * sin_i + c2 * cos_w * sin_i
-
-        planets[i]["position"] = [x, y, z]
-
-        ni = constants.GRAV_CONSTANT * (constants.sun_mass + constants.planets_mass[i])
-
-        c1 = -Angle.sin_deg(E) * math.sqrt(ni * a) / r
-        c2 = math.sqrt(1 - e ** 2) * Angle.cos_deg(E) * math.sqrt(ni * a) / r
-
-        vx = c1 * (cos_w * cos_N - sin_w * sin_N * cos_i) - c2 * (sin_w * cos_N + cos_w * sin_N * cos_i)
-        vy = c1 * (cos_w * sin_N + sin_w * cos_N * cos_i) + c2 * (cos_w * cos_N * cos_i - sin_w * sin_N)
-        vz = c1 * sin_w * sin_i + c2 * cos_w * sin_i
-
-        planets[i]["velocity"] = [vx, vy, vz]
-
-    return planets
+    states = load_states(julian_date)[0]
+    return [{
+        "name": constants.planets_names[i],
+        "position": states[i, :3].tolist(),
+        "velocity": states[i, 3:].tolist()
+    } for i in range(9)]
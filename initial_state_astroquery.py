@@ -1,38 +1,126 @@
-from astropy.time import Time
-from astroquery.jplhorizons import Horizons
-
-
-def retrieve_data(start_date: str):
-    planets = []
-    for planet_id in range(1, 10):
-        planet = Horizons(
-            id=planet_id,
-            location="@sun",
-            epochs=Time(start_date).jd).vectors()
-        print(planet["targetname"].value[0].split()[0])
-        planets.append({
-            "name": planet["targetname"].value[0].split()[0],
-            "position": [planet[ci].value[0] for ci in ['x', 'y', 'z']],
-            "velocity": [planet[vi].value[0] for vi in ['vx', 'vy', 'vz']]
-        })
-    import os
-    os.makedirs(os.path.dirname(f"data/{start_date}.json"), exist_ok=True)
-    with open(f"data/{start_date}.json", "w") as f:
-        import json
-        json.dump({
-            "date": start_date,
-            "planets": planets
-        }, f, indent=4)
-
-
-def load_data(start_date: str) -> list[dict]:
-    import os
-    if not os.path.exists(f"data/{start_date}.json"):
-        retrieve_data(start_date)
-
-    with open(f"data/{start_date}.json", "r") as f:
-        import json
-        data = json.load(f)
-        planets = data["planets"]
-
-    return planets
+import concurrent.futures
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import numpy.typing as npt
+
+
+class HorizonsTransport:
+    """ Fetches heliocentric state vectors of one body at many epochs per request from JPL Horizons """
+
+    def __call__(self, body_id: int, julian_dates: list[float]) -> list[dict]:
+        from astroquery.jplhorizons import Horizons
+        table = Horizons(id=body_id, location="@sun", epochs=list(julian_dates)).vectors()
+        return [{
+            "name": table["targetname"][k].split()[0],
+            "jd": float(table["datetime_jd"][k]),
+            "position": [float(table[ci][k]) for ci in ['x', 'y', 'z']],
+            "velocity": [float(table[vi][k]) for vi in ['vx', 'vy', 'vz']]
+        } for k in range(len(table))]
+
+
+class FixtureTransport:
+    """
+    Offline stand-in reading {directory}/{body_id}.json files, each holding a list of records in the same form
+    as returned by HorizonsTransport
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def __call__(self, body_id: int, julian_dates: list[float]) -> list[dict]:
+        with open(os.path.join(self.directory, f"{body_id}.json"), "r") as f:
+            records = {round(record["jd"], 6): record for record in json.load(f)}
+        return [records[round(jd, 6)] for jd in julian_dates if round(jd, 6) in records]
+
+
+class Cache:
+    """ Single SQLite file indexed by (body_id, jd) holding all fetched state vectors """
+
+    def __init__(self, path="data/horizons.sqlite"):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS vectors (body_id INTEGER, jd REAL, name TEXT, "
+                                "x REAL, y REAL, z REAL, vx REAL, vy REAL, vz REAL, PRIMARY KEY (body_id, jd))")
+
+    def get(self, body_id: int, julian_dates: list[float]) -> dict[float, tuple]:
+        rows = {}
+        for start in range(0, len(julian_dates), 500):
+            chunk = [round(jd, 6) for jd in julian_dates[start:start + 500]]
+            rows.update({row[0]: row[1:] for row in self.connection.execute(
+                f"SELECT jd, name, x, y, z, vx, vy, vz FROM vectors WHERE body_id = ? AND jd IN "
+                f"({', '.join('?' * len(chunk))})", [body_id] + chunk)})
+        return rows
+
+    def put(self, body_id: int, records: list[dict]):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (body_id, round(record["jd"], 6), record["name"], *record["position"], *record["velocity"])
+                for record in records
+            ])
+
+
+def with_retries(transport, attempts=4, backoff=1.0):
+    """ Wrap a transport so failed requests are retried, waiting backoff * 2^k seconds before the k-th retry """
+    def fetch(body_id, julian_dates):
+        for attempt in range(attempts):
+            try:
+                return transport(body_id, julian_dates)
+            except Exception:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+    return fetch
+
+
+def fetch_states(body_ids: list[int], julian_dates: list[float], transport=None, cache: Cache = None, workers=4,
+                 chunk_size=50) -> tuple[list[str], npt.NDArray[float]]:
+    """
+    Names and (n_dates, n_bodies, 6) heliocentric states of the given Horizons bodies at the given Julian dates.
+    Only vectors missing from the cache are requested, chunk_size epochs per request and up to `workers`
+    requests at a time.
+    """
+    transport = with_retries(transport or HorizonsTransport())
+    cache = cache or Cache()
+    julian_dates = [round(float(jd), 6) for jd in julian_dates]
+
+    requests = []
+    for body_id in body_ids:
+        cached = cache.get(body_id, julian_dates)
+        missing = [jd for jd in julian_dates if jd not in cached]
+        requests += [(body_id, missing[k:k + chunk_size]) for k in range(0, len(missing), chunk_size)]
+    if requests:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            futures = {pool.submit(transport, body_id, epochs): body_id for body_id, epochs in requests}
+            for future in concurrent.futures.as_completed(futures):
+                cache.put(futures[future], future.result())
+        print(f"Fetched {sum(len(epochs) for _, epochs in requests)} state vectors from Horizons")
+
+    names = []
+    states = np.empty((len(julian_dates), len(body_ids), 6))
+    for k, body_id in enumerate(body_ids):
+        rows = cache.get(body_id, julian_dates)
+        missing = [jd for jd in julian_dates if jd not in rows]
+        if missing:
+            raise ValueError(f"No state vectors for body {body_id} at {len(missing)} epochs, e.g. JD {missing[0]}")
+        names.append(rows[julian_dates[0]][0])
+        states[:, k] = [rows[jd][1:] for jd in julian_dates]
+    return names, states
+
+
+def default_transport():
+    """ Horizons, unless SOLARPY_HORIZONS_FIXTURES points to a fixture directory to be used instead """
+    fixtures = os.environ.get("SOLARPY_HORIZONS_FIXTURES")
+    return FixtureTransport(fixtures) if fixtures else HorizonsTransport()
+
+
+def load_data(julian_date: float, transport=None) -> list[dict]:
+    names, states = fetch_states(list(range(1, 10)), [julian_date], transport or default_transport())
+    return [{
+        "name": name,
+        "position": states[0, k, :3].tolist(),
+        "velocity": states[0, k, 3:].tolist()
+    } for k, name in enumerate(names)]
@@ -0,0 +1,320 @@
+"""
+Whole-system integrators advancing positions and velocities of all bodies at once
+"""
+
+import constants
+import numpy as np
+import numpy.typing as npt
+import forces
+from forces import direct_accelerations
+
+
+class Integrator:
+    """
+    Base class for integrators working on (N, 3) position and velocity arrays, or (M, N, 3) arrays of M
+    independent systems sharing the same fixed bodies. Bodies from index n_massive on are massless test
+    particles: they feel the massive bodies but exert no force, so they cost O(n_massive) each.
+    """
+    name = None
+
+    def __init__(self, masses: npt.NDArray[float], fixed: npt.NDArray[bool] = None, force=direct_accelerations,
+                 n_massive=None):
+        self.masses = np.asarray(masses, dtype=float)
+        self.fixed = np.zeros(self.masses.shape[-1], dtype=bool) if fixed is None else np.asarray(fixed, dtype=bool)
+        self.force = force
+        self.n_massive = self.masses.shape[-1] if n_massive is None else n_massive
+        self.force_evaluations = 0
+
+    def accelerations(self, positions: npt.NDArray[float]) -> npt.NDArray[float]:
+        self.force_evaluations += 1
+        n = self.n_massive
+        if n == positions.shape[-2]:
+            a = self.force(positions, self.masses)
+        else:
+            a = np.empty_like(positions)
+            a[..., :n, :] = self.force(positions[..., :n, :], self.masses[..., :n])
+            a[..., n:, :] = forces.field_accelerations(positions[..., n:, :], positions[..., :n, :],
+                                                       self.masses[..., :n])
+        a[..., self.fixed, :] = 0
+        return a
+
+    def step(self, positions: npt.NDArray[float], velocities: npt.NDArray[float], dt: float):
+        """ Advance positions and velocities in place by dt (in days) """
+        raise NotImplementedError
+
+    def get_state(self) -> dict:
+        """ State (scalars or arrays) that should survive a checkpoint, besides positions and velocities """
+        return {}
+
+    def set_state(self, state: dict):
+        pass
+
+
+class RungeKutta4(Integrator):
+    """ Classical Runge-Kutta method applied to all bodies simultaneously """
+    name = "rk4"
+
+    def step(self, positions, velocities, dt):
+        x0 = np.array(positions)
+        v0 = np.array(velocities)
+        k1x, k1v = v0, self.accelerations(x0)
+        k2x, k2v = v0 + k1v * (dt * 0.5), self.accelerations(x0 + k1x * (dt * 0.5))
+        k3x, k3v = v0 + k2v * (dt * 0.5), self.accelerations(x0 + k2x * (dt * 0.5))
+        k4x, k4v = v0 + k3v * dt, self.accelerations(x0 + k3x * dt)
+        positions[...] = x0 + (k1x + 2 * k2x + 2 * k3x + k4x) * (dt / 6)
+        velocities[...] = v0 + (k1v + 2 * k2v + 2 * k3v + k4v) * (dt / 6)
+
+
+class CompiledRungeKutta4(RungeKutta4):
+    """
+    Classical Runge-Kutta with force evaluations and stage combinations fused into loops over scratch buffers
+    allocated once, compiled with Numba if available (kernels.AVAILABLE). Batched states and force backends other
+    than direct summation use RungeKutta4.
+    """
+    name = "rk4-jit"
+
+    def __init__(self, masses, fixed=None, force=direct_accelerations, n_massive=None):
+        super().__init__(masses, fixed, force, n_massive)
+        self.buffers = None
+
+    def step(self, positions, velocities, dt):
+        import kernels
+        if positions.ndim != 2 or self.force not in (direct_accelerations, forces.jit_accelerations):
+            return super().step(positions, velocities, dt)
+        if self.buffers is None or self.buffers.shape[1:] != positions.shape:
+            self.buffers = np.zeros((kernels.BUFFERS,) + positions.shape)
+        kernels.rk4_step(positions, velocities, self.masses, self.n_massive, self.fixed, dt, self.buffers)
+        self.force_evaluations += 4
+
+
+class DormandPrince(Integrator):
+    """
+    Adaptive Dormand-Prince 5(4) method with an embedded error estimate. The integrator keeps its own internal
+    state and step size, which is free to run ahead of the requested output times; outputs are sampled from
+    the 4th order dense output of the last accepted step.
+    """
+    name = "dopri5"
+
+    C = [0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1]
+    A = [
+        [],
+        [1 / 5],
+        [3 / 40, 9 / 40],
+        [44 / 45, -56 / 15, 32 / 9],
+        [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+        [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656]
+    ]
+    B = [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]
+    E = [-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40]
+    P = np.array([
+        [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+        [0, 0, 0, 0],
+        [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+        [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+        [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+        [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+        [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423]
+    ])
+
+    def __init__(self, masses, fixed=None, force=direct_accelerations, n_massive=None, atol=1e-12, rtol=1e-9,
+                 safety=0.9, min_factor=0.2, max_factor=5.0):
+        super().__init__(masses, fixed, force, n_massive)
+        self.atol = atol
+        self.rtol = rtol
+        self.safety = safety
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.h = None
+        self.accepted_steps = 0
+        self.rejected_steps = 0
+        self.output = None  # last state handed out, used to detect changes made outside the integrator
+
+    STATE = ["h_old", "t", "t_old", "t_output", "y", "y_old", "k", "Q", "output"]
+
+    def get_state(self):
+        """ Step size and, once stepping, the last step's dense output, so that a restored run continues exactly """
+        if self.output is None:
+            return {"h": self.h}
+        return {"h": self.h, **{name: getattr(self, name) for name in self.STATE}}
+
+    def set_state(self, state):
+        self.h = state.get("h")
+        self.output = None
+        if "output" in state:
+            for name in self.STATE:
+                setattr(self, name, np.array(state[name]) if isinstance(state[name], np.ndarray) else state[name])
+
+    def derivative(self, y):
+        return np.concatenate((y[..., 3:], self.accelerations(y[..., :3])), axis=-1)
+
+    def restart(self, y, dt):
+        self.t = self.t_old = self.t_output = 0.0
+        self.y = self.y_old = y
+        self.k = self.derivative(y)
+        self.Q = np.zeros((4,) + y.shape)
+        self.h_old = 0.0
+        self.h = self.h or dt
+
+    def advance(self):
+        """ Take one accepted step from the internal state, shrinking the step size until the error is tolerable """
+        while True:
+            h = self.h
+            K = [self.k]
+            for s in range(1, 6):
+                K.append(self.derivative(self.y + h * sum(a * k for a, k in zip(self.A[s], K))))
+            y_new = self.y + h * sum(b * k for b, k in zip(self.B, K))
+            K.append(self.derivative(y_new))
+            error = h * sum(e * k for e, k in zip(self.E, K))
+            scale = self.atol + self.rtol * np.maximum(np.abs(self.y), np.abs(y_new))
+            error_norm = np.sqrt(np.mean((error / scale) ** 2))
+
+            if error_norm <= 1:
+                factor = self.max_factor if error_norm == 0 else self.safety * error_norm ** -0.2
+                self.h = h * min(self.max_factor, max(self.min_factor, factor))
+                self.accepted_steps += 1
+                break
+            self.h = h * max(self.min_factor, self.safety * error_norm ** -0.2)
+            self.rejected_steps += 1
+
+        self.t_old, self.t = self.t, self.t + h
+        self.y_old, self.y = self.y, y_new
+        self.k = K[6]
+        self.h_old = h
+        self.Q = np.tensordot(self.P, np.array(K), axes=(0, 0))
+
+    def dense_output(self, t):
+        """ State at time t within the last accepted step """
+        if self.h_old == 0 or t == self.t:
+            return np.array(self.y)
+        x = (t - self.t_old) / self.h_old
+        return self.y_old + self.h_old * sum(q * x ** (j + 1) for j, q in enumerate(self.Q))
+
+    def step(self, positions, velocities, dt):
+        y = np.concatenate((positions, velocities), axis=-1)
+        if self.output is None or not np.array_equal(y, self.output):
+            self.restart(y, dt)
+        self.t_output += dt
+        while self.t < self.t_output:
+            self.advance()
+        self.output = self.dense_output(self.t_output)
+        positions[...] = self.output[..., :3]
+        velocities[...] = self.output[..., 3:]
+
+
+class Leapfrog(Integrator):
+    """
+    Symplectic kick-drift-kick leapfrog. Higher order methods are built as compositions of leapfrog substeps
+    with the given weights; the acceleration at the end of each substep is reused by the next one, so each
+    step costs one force evaluation per weight.
+    """
+    name = "leapfrog"
+    weights = [1.0]
+
+    def __init__(self, masses, fixed=None, force=direct_accelerations, n_massive=None):
+        super().__init__(masses, fixed, force, n_massive)
+        self.cached_positions = None
+        self.cached_accelerations = None
+
+    def kick_accelerations(self, positions):
+        """ Accelerations at positions, reusing the ones computed at the end of the previous substep """
+        if self.cached_positions is None or not np.array_equal(positions, self.cached_positions):
+            self.cached_positions = np.array(positions)
+            self.cached_accelerations = self.accelerations(positions)
+        return self.cached_accelerations
+
+    def drift(self, positions, velocities, dt):
+        positions += velocities * dt
+
+    def step(self, positions, velocities, dt):
+        for weight in self.weights:
+            h = dt * weight
+            velocities += self.kick_accelerations(positions) * (h * 0.5)
+            self.drift(positions, velocities, h)
+            velocities += self.kick_accelerations(positions) * (h * 0.5)
+
+
+class Yoshida4(Leapfrog):
+    """ 4th order symplectic method of Yoshida (1990), a composition of three leapfrog substeps """
+    name = "yoshida4"
+    weights = [1 / (2 - 2 ** (1 / 3)), -2 ** (1 / 3) / (2 - 2 ** (1 / 3)), 1 / (2 - 2 ** (1 / 3))]
+
+
+class WisdomHolman(Leapfrog):
+    """
+    Wisdom-Holman mapping: the Keplerian motion of each body around the fixed central body is solved
+    analytically, and only the mutual interactions between the remaining bodies are applied as kicks.
+    Suitable for bound orbits only.
+    """
+    name = "wh"
+
+    def __init__(self, masses, fixed=None, force=direct_accelerations, n_massive=None, tolerance=1e-14,
+                 max_iterations=50):
+        super().__init__(masses, fixed, force, n_massive)
+        if np.count_nonzero(self.fixed) != 1:
+            raise ValueError("Wisdom-Holman mapping requires exactly one fixed central body")
+        self.central = int(np.flatnonzero(self.fixed)[0])
+        self.moving = ~self.fixed
+        self.interacting = np.flatnonzero(self.moving[:self.n_massive])  # massive bodies besides the central one
+        self.mu = constants.GRAV_CONSTANT * self.masses[..., self.central, np.newaxis]
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+
+    def accelerations(self, positions):
+        """ Mutual accelerations between the non-central bodies, and their pull on test particles """
+        self.force_evaluations += 1
+        a = np.zeros_like(positions)
+        sources, masses = positions[..., self.interacting, :], self.masses[..., self.interacting]
+        a[..., self.interacting, :] = self.force(sources, masses)
+        a[..., self.n_massive:, :] = forces.field_accelerations(positions[..., self.n_massive:, :], sources, masses)
+        return a
+
+    def drift(self, positions, velocities, dt):
+        """ Advance every body along its Kepler orbit around the central body using f and g functions """
+        center = positions[..., self.central, np.newaxis, :]
+        r0 = positions[..., self.moving, :] - center
+        v0 = velocities[..., self.moving, :]
+        r0n = np.sqrt(np.einsum('...ij,...ij->...i', r0, r0))
+        a = 1 / (2 / r0n - np.einsum('...ij,...ij->...i', v0, v0) / self.mu)
+        if np.any(a <= 0):
+            raise ValueError("Wisdom-Holman drift does not support unbound orbits")
+        n = np.sqrt(self.mu / a ** 3)
+        sigma = np.einsum('...ij,...ij->...i', r0, v0) / np.sqrt(self.mu * a)
+        ecc = 1 - r0n / a
+
+        # Kepler's equation for the change in eccentric anomaly x, started from E = pi (plus whole orbits) near e = 1
+        # like elements_to_states, as ecc and sigma are e cos E and e sin E at the start of the drift
+        E0 = np.arctan2(sigma, ecc)
+        orbits = np.floor((E0 - sigma + n * dt) / (2 * np.pi))
+        x = np.where(ecc ** 2 + sigma ** 2 > 0.64, np.pi * (2 * orbits + 1) - E0, n * dt)
+        for _ in range(self.max_iterations):
+            sin_x, cos_x = np.sin(x), np.cos(x)
+            correction = (x - ecc * sin_x + sigma * (1 - cos_x) - n * dt) / (1 - ecc * cos_x + sigma * sin_x)
+            x -= correction
+            if np.all(np.abs(correction) < self.tolerance):
+                break
+        else:
+            # corrections close to perihelion stall at rounding level, the residual of Kepler's equation doesn't
+            if np.any(np.abs(x - ecc * np.sin(x) + sigma * (1 - np.cos(x)) - n * dt) > self.tolerance):
+                raise ValueError(f"Wisdom-Holman drift did not converge in {self.max_iterations} iterations")
+
+        sin_x, cos_x = np.sin(x), np.cos(x)
+        r = a + (r0n - a) * cos_x + sigma * a * sin_x
+        f = 1 - a / r0n * (1 - cos_x)
+        g = dt - (x - sin_x) / n
+        f_dot = -np.sqrt(self.mu * a) / (r * r0n) * sin_x
+        g_dot = 1 - a / r * (1 - cos_x)
+        positions[..., self.moving, :] = center + f[..., np.newaxis] * r0 + g[..., np.newaxis] * v0
+        velocities[..., self.moving, :] = f_dot[..., np.newaxis] * r0 + g_dot[..., np.newaxis] * v0
+
+
+INTEGRATORS = {cls.name: cls for cls in [RungeKutta4, CompiledRungeKutta4, DormandPrince, Leapfrog, Yoshida4,
+                                         WisdomHolman]}
+
+
+def create_integrator(name: str, masses, fixed=None, force="direct", force_options=None, **kwargs) -> Integrator:
+    """ Integrator by name; the force backend may be given by name (see forces.FORCES) with its options """
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator '{name}', expected one of: {', '.join(INTEGRATORS)}")
+    if isinstance(force, str):
+        force = forces.create_force(force, **(force_options or {}))
+    return INTEGRATORS[name](masses, fixed, force=force, **kwargs)
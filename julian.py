@@ -0,0 +1,43 @@
+"""
+Julian dates of the proleptic Gregorian calendar. The simulation keeps time as a Julian date at 0h of its start date
+plus a whole number of elapsed hours; calendar dates are only used to parse input and to name output. Years are
+astronomical, so 0 is 1 BC and -2999 is 3000 BC.
+"""
+
+
+def day_number(year, month, day):
+    """ Julian day number of a calendar date (the Julian date at its noon), works element-wise on integer arrays """
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    return day + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045
+
+
+def julian_date(year, month, day, hour=0):
+    """ Julian date of the given hour of a calendar date, 0h by default """
+    return day_number(year, month, day) - 0.5 + hour / 24
+
+
+def parse_date(date: str) -> float:
+    """ Julian date at 0h of a YYYY-MM-DD date, with a leading minus sign for years before 1 AD (1 BC is 0) """
+    sign = -1 if date.startswith("-") else 1
+    year, month, day = [int(i) for i in date.lstrip("-").split("-")]
+    return julian_date(sign * year, month, day)
+
+
+def calendar_date(julian_date: float) -> tuple[int, int, int, int]:
+    """ (year, month, day, hour) of a Julian date, rounded to the nearest hour """
+    hours = round((julian_date + 0.5) * 24)
+    j = hours // 24
+    f = j + 1401 + (4 * j + 274277) // 146097 * 3 // 4 - 38
+    e = 4 * f + 3
+    h = 5 * (e % 1461 // 4) + 2
+    month = (h // 153 + 2) % 12 + 1
+    return e // 1461 - 4716 + (14 - month) // 12, month, h % 153 // 5 + 1, hours % 24
+
+
+def format_date(julian_date: float, with_hour=False) -> str:
+    """ YYYY-MM-DD of a Julian date, followed by the hour as in '2000-01-01 (12h)' if with_hour """
+    year, month, day, hour = calendar_date(julian_date)
+    date = f"{'-' if year < 0 else ''}{abs(year):04d}-{month:02d}-{day:02d}"
+    return f"{date} ({hour:02d}h)" if with_hour else date
@@ -0,0 +1,135 @@
+"""
+Optional compiled kernels for force evaluation and fused Runge-Kutta steps. They are compiled with Numba when it
+is installed and fall back to equivalent NumPy code otherwise, so results agree to rounding error either way.
+"""
+
+import constants
+import numpy as np
+import numpy.typing as npt
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+AVAILABLE = numba is not None
+PARALLEL_THRESHOLD = 256  # bodies from which loops over bodies are spread across cores
+BUFFERS = 7  # scratch arrays of the shape of the state needed by rk4_step
+
+_compiled = {}
+_scratch = {}
+
+
+def compiled_kernels(parallel: bool) -> tuple:
+    """ Compiled (accelerations, rk4_step) pair, built on first use; prange runs serially unless parallel """
+    if parallel in _compiled:
+        return _compiled[parallel]
+    jit = numba.njit(nogil=True, parallel=parallel)
+    G = constants.GRAV_CONSTANT
+
+    @jit
+    def accelerations(positions, masses, n_massive, fixed, out):
+        for i in numba.prange(positions.shape[0]):
+            ax = ay = az = 0.0
+            if not fixed[i]:
+                for j in range(n_massive):
+                    if j == i:
+                        continue
+                    dx = positions[j, 0] - positions[i, 0]
+                    dy = positions[j, 1] - positions[i, 1]
+                    dz = positions[j, 2] - positions[i, 2]
+                    dsq = dx * dx + dy * dy + dz * dz
+                    factor = G * masses[j] / (dsq * np.sqrt(dsq))
+                    ax += factor * dx
+                    ay += factor * dy
+                    az += factor * dz
+            out[i, 0] = ax
+            out[i, 1] = ay
+            out[i, 2] = az
+
+    @jit
+    def rk4_step(x, v, masses, n_massive, fixed, dt, buffers):
+        x0, v0, xs, kx, kv, sx, sv = buffers[0], buffers[1], buffers[2], buffers[3], buffers[4], buffers[5], buffers[6]
+        n = x.shape[0]
+        for i in numba.prange(n):
+            for d in range(3):
+                x0[i, d], v0[i, d] = x[i, d], v[i, d]
+                kx[i, d] = kv[i, d] = sx[i, d] = sv[i, d] = 0.0
+        for stage in range(4):
+            c = 0.0 if stage == 0 else dt if stage == 3 else dt * 0.5
+            w = 1.0 if stage == 0 or stage == 3 else 2.0
+            for i in numba.prange(n):
+                for d in range(3):
+                    xs[i, d] = x0[i, d] + kx[i, d] * c
+                    kx[i, d] = v0[i, d] + kv[i, d] * c
+            accelerations(xs, masses, n_massive, fixed, kv)
+            for i in numba.prange(n):
+                for d in range(3):
+                    sx[i, d] += w * kx[i, d]
+                    sv[i, d] += w * kv[i, d]
+        for i in numba.prange(n):
+            for d in range(3):
+                x[i, d] = x0[i, d] + sx[i, d] * (dt / 6)
+                v[i, d] = v0[i, d] + sv[i, d] * (dt / 6)
+
+    _compiled[parallel] = accelerations, rk4_step
+    return _compiled[parallel]
+
+
+def accelerations(positions: npt.NDArray[float], masses: npt.NDArray[float], n_massive: int,
+                  fixed: npt.NDArray[bool], out: npt.NDArray[float]) -> npt.NDArray[float]:
+    """
+    Accelerations of (N, 3) positions written into out: bodies from n_massive on are massless and fixed bodies
+    don't move, as in Integrator.accelerations
+    """
+    if AVAILABLE:
+        compiled_kernels(len(positions) >= PARALLEL_THRESHOLD)[0](positions, masses, n_massive, fixed, out)
+        return out
+    n = len(positions)
+    if (n, n_massive) not in _scratch:
+        _scratch[n, n_massive] = (np.empty(n_massive), np.empty((n, n_massive, 3)), np.empty((n, n_massive, 3)),
+                                  np.empty((n, n_massive)))
+    gm, offsets, squares, factors = _scratch[n, n_massive]
+    # Same operations as forces.direct_accelerations and forces.field_accelerations, written into scratch buffers
+    np.multiply(masses[:n_massive], constants.GRAV_CONSTANT, out=gm)
+    np.subtract(positions[np.newaxis, :n_massive], positions[:, np.newaxis], out=offsets)
+    np.multiply(offsets, offsets, out=squares)
+    np.sum(squares, axis=-1, out=factors)
+    factors[:n_massive].flat[::n_massive + 1] = np.inf
+    np.sqrt(factors, out=squares[..., 0])
+    np.multiply(factors, squares[..., 0], out=factors)
+    np.divide(gm, factors, out=factors)
+    np.einsum('ij,ijk->ik', factors, offsets, out=out)
+    np.copyto(out, 0.0, where=fixed[:, np.newaxis])
+    return out
+
+
+def rk4_step(x: npt.NDArray[float], v: npt.NDArray[float], masses: npt.NDArray[float], n_massive: int,
+             fixed: npt.NDArray[bool], dt: float, buffers: npt.NDArray[float]):
+    """
+    Classical Runge-Kutta step of (N, 3) positions and velocities in place, with every intermediate result kept in
+    buffers of shape (BUFFERS, N, 3). Stages are combined in the same order as RungeKutta4.step.
+    """
+    if AVAILABLE:
+        compiled_kernels(len(x) >= PARALLEL_THRESHOLD)[1](x, v, masses, n_massive, fixed, dt, buffers)
+        return
+    x0, v0, xs, kx, kv, sx, sv = buffers
+    np.copyto(x0, x)
+    np.copyto(v0, v)
+    kx.fill(0)
+    kv.fill(0)
+    sx.fill(0)
+    sv.fill(0)
+    for c, w in ((0.0, 1.0), (dt * 0.5, 2.0), (dt * 0.5, 2.0), (dt, 1.0)):
+        np.multiply(kx, c, out=xs)
+        xs += x0
+        np.multiply(kv, c, out=kx)
+        kx += v0
+        accelerations(xs, masses, n_massive, fixed, kv)
+        # xs is free until the next stage, so it holds the weighted stage derivatives
+        sx += np.multiply(kx, w, out=xs)
+        sv += np.multiply(kv, w, out=xs)
+    np.multiply(sx, dt / 6, out=sx)
+    np.add(x0, sx, out=x)
+    np.multiply(sv, dt / 6, out=sv)
+    np.add(v0, sv, out=v)
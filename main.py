@@ -1,11 +1,105 @@
+import julian
 import sys
 import time
+from profiler import PROFILER
+
+
+def handle_system_keys(event, system) -> bool:
+    """ Keys acting on the simulation state, returns whether the state jumped """
+    import pygame
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+        system.dump_state()
+        print(f"Dumped state for {system.get_date()}")
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_c:
+        hour = julian.calendar_date(system.julian_date())[3]
+        system.save_checkpoint(f"output/{julian.format_date(system.julian_date())}_{hour:02d}.npz")
+        print(f"Saved checkpoint for {system.get_date()}")
+    if event.type == pygame.KEYDOWN and event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+        year, month, day, _ = julian.calendar_date(system.julian_date())
+        year += 1 if event.key == pygame.K_RIGHT else -1
+        try:
+            system.set_date(f"{year}-{month}-{day}")
+        except ValueError as e:
+            print(e)
+            return False
+        return True
+    return False
+
+
+def handle_profiler_keys(event):
+    """ F3 toggles profiling, F4 exports the recorded phases as a Chrome trace """
+    import pygame
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+        PROFILER.toggle()
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+        path = f"output/trace_{time.strftime('%Y-%m-%d_%H-%M-%S')}.json"
+        PROFILER.export_trace(path)
+        print(f"Exported trace to {path}")
+
+
+def present(window, renderer, rendered_system):
+    """ Show a rendered frame, with the profiling overlay on top while profiling """
+    import pygame
+    with PROFILER.phase("flip"):
+        window.blit(rendered_system, (0, 0))
+        if PROFILER.enabled:
+            renderer.render_overlay(window, PROFILER.overlay_lines())
+        pygame.display.flip()
+
+
+def run_threaded(window, system, renderer, dt):
+    """ Render loop with the simulation stepped by a background thread, speed is no longer tied to frame rate """
+    import pygame
+    from simulation_thread import SimulationThread
+    worker = SimulationThread(system, dt=dt)
+    worker.start()
+    clock = pygame.time.Clock()
+    fps = 60
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                worker.stop()
+                pygame.quit()
+                return
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                worker.paused = not worker.paused
+            if event.type == pygame.MOUSEWHEEL and pygame.mouse.get_pressed()[2]:
+                worker.speed = min(max(worker.speed * 1.1 ** event.y, 1), 100000)
+            with worker.lock:
+                if handle_system_keys(event, system):
+                    worker.publish(reset=True)
+            handle_profiler_keys(event)
+            renderer.handle_events(event)
+
+        renderer.handle_input()
+
+        with worker.lock:
+            with PROFILER.phase("render"):
+                rendered_system = renderer.render(system, positions=worker.interpolated_positions())
+            date = system.get_date()
+        present(window, renderer, rendered_system)
+
+        with PROFILER.phase("idle"):
+            clock.tick(fps)
+        PROFILER.end_frame()
+        pygame.display.set_caption(f"SolarPy | {date} | Speed: {worker.speed:.0f} days/s" +
+                                   (" (!)" if worker.steps_per_second * dt / 24 < worker.speed * 0.8
+                                    and not worker.paused else "") +
+                                   (" | PAUSED" if worker.paused else ""))
 
 
 def main():
     start_date = None
     use_horizons = False
-    dt = 24  # in hours
+    dt = None  # in hours, 24 or the step of a restored checkpoint by default
+    integrator = None
+    update_mode = "sequential"
+    integrator_options = {}
+    ephemeris = False
+    restore = None
+    threaded = False
+    profile = False
 
     for i in sys.argv:
         arg, *val = i.split("=")
@@ -19,6 +113,28 @@ def main():
             dt = int(val[0])
         if arg == "--horizons":
             use_horizons = True
+        if arg == "--integrator":
+            integrator = val[0]
+        if arg == "--atol" or arg == "--rtol":
+            integrator_options[arg[2:]] = float(val[0])
+        if arg == "--force":
+            integrator_options["force"] = val[0]
+        if arg == "--theta":
+            integrator_options["force_options"] = {"theta": float(val[0])}
+        if arg == "--simultaneous":
+            update_mode = "simultaneous"
+        if arg == "--threaded":
+            threaded = True
+        if arg == "--profile":
+            profile = True
+        if arg == "--restore":
+            restore = val[0]
+        if arg == "--ephemeris":
+            ephemeris = True
+        if arg == "--headless":
+            import propagate
+            propagate.main(sys.argv[1:])
+            return
 
     if not start_date:
         localtime = time.localtime()
@@ -32,13 +148,24 @@ def main():
     clock = pygame.time.Clock()
 
     from solarsystem import SolarSystem
-    system = SolarSystem(
+    system = SolarSystem.load_checkpoint(restore) if restore else SolarSystem(
         start_date=start_date,
-        use_horizons=use_horizons
+        use_horizons=use_horizons,
+        integrator=integrator,
+        update_mode=update_mode,
+        integrator_options=integrator_options,
+        ephemeris=ephemeris,
+        dt=dt or 24
     )
+    dt = system.dt = dt or system.dt
 
     from renderer import Renderer
     renderer = Renderer()
+    PROFILER.enable(profile)
+
+    if threaded:
+        run_threaded(window, system, renderer, dt)
+        return
 
     paused = True
     frame_counter = 0
@@ -54,9 +181,8 @@ def main():
                 return
             if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                 paused = not paused
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
-                system.dump_state()
-                print(f"Dumped state for {system.get_date()}")
+            handle_system_keys(event, system)
+            handle_profiler_keys(event)
             if event.type == pygame.MOUSEWHEEL and pygame.mouse.get_pressed()[2]:
                 if event.y > 0:
                     simulation_speed = min(simulation_speed + 1, 365)
@@ -83,11 +209,13 @@ def main():
                     system.update_rk(dt=dt)
                 # print(_skip_days, curr_fps, simulation_speed)
 
-        rendered_system = renderer.render(system)
-        window.blit(rendered_system, (0, 0))
-        pygame.display.flip()
+        with PROFILER.phase("render"):
+            rendered_system = renderer.render(system)
+        present(window, renderer, rendered_system)
 
-        clock.tick(curr_fps)
+        with PROFILER.phase("idle"):
+            clock.tick(curr_fps)
+        PROFILER.end_frame()
         pygame.display.set_caption(f"SolarPy | {system.get_date()} | Speed: {simulation_speed*dt/24:.2f} days/s" +
                                    (" (!)" if clock.get_fps() < curr_fps * 0.8 else "") +
                                    (" | PAUSED" if paused else ""))
@@ -0,0 +1,154 @@
+"""
+Low-overhead timing instrumentation of the simulation and render loops, switched on and off at runtime
+"""
+
+import collections
+import contextlib
+import gc
+import json
+import os
+import sys
+import threading
+import time
+
+NULL_PHASE = contextlib.nullcontext()
+
+
+class Phase:
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *args):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+
+
+class Profiler:
+    """
+    Collects phase timings and counters per frame while enabled. Phases are timed with `with PROFILER.phase(name)`,
+    which costs a single attribute check while disabled; end_frame() closes a frame, keeps the last `window` frames
+    for the overlay and prints a JSON summary line every `log_interval` seconds. Every phase is also kept as an
+    event (up to max_events) for export as a Chrome trace, viewable in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, window=60, log_interval=5.0, max_events=200000, log_file=None):
+        self.enabled = False
+        self.window = window
+        self.log_interval = log_interval
+        self.log_file = log_file
+        self.lock = threading.Lock()
+        self.events = collections.deque(maxlen=max_events)  # (name, thread id, start ns, end ns)
+        self.history = collections.deque(maxlen=window)
+        self.reset()
+
+    def reset(self):
+        self.phases = collections.defaultdict(int)  # ns per phase in the current frame
+        self.counters = collections.defaultdict(int)
+        self.frame_start = time.perf_counter_ns()
+        self.blocks = sys.getallocatedblocks()
+        self.collections = sum(stats["collections"] for stats in gc.get_stats())
+        self.last_log = time.perf_counter()
+
+    def enable(self, enabled=True):
+        if enabled and not self.enabled:
+            self.history.clear()
+            self.reset()
+        self.enabled = enabled
+
+    def toggle(self):
+        self.enable(not self.enabled)
+        print(f"Profiling {'enabled' if self.enabled else 'disabled'}")
+
+    def phase(self, name: str):
+        return Phase(self, name) if self.enabled else NULL_PHASE
+
+    def record(self, name: str, start: int, end: int):
+        with self.lock:
+            self.phases[name] += end - start
+            self.events.append((name, threading.get_ident(), start, end))
+
+    def count(self, name: str, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += n
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        blocks = sys.getallocatedblocks()
+        collected = sum(stats["collections"] for stats in gc.get_stats())
+        with self.lock:
+            self.history.append({
+                "frame_ms": (now - self.frame_start) / 1e6,
+                "phases_ms": {name: value / 1e6 for name, value in self.phases.items()},
+                "counters": dict(self.counters),
+                "allocated_blocks": blocks - self.blocks,
+                "gc_collections": collected - self.collections
+            })
+            self.phases = collections.defaultdict(int)
+            self.counters = collections.defaultdict(int)
+            self.frame_start, self.blocks, self.collections = now, blocks, collected
+        if time.perf_counter() - self.last_log >= self.log_interval:
+            self.last_log = time.perf_counter()
+            print(json.dumps(self.summary()), file=self.log_file or sys.stdout, flush=True)
+
+    def summary(self) -> dict:
+        """ Averages per frame over the recorded window """
+        frames = list(self.history)
+        if not frames:
+            return {}
+        mean = lambda values: sum(values) / len(frames)
+        names = sorted({name for frame in frames for name in frame["phases_ms"]})
+        steps = sum(frame["counters"].get("steps", 0) for frame in frames)
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "frames": len(frames),
+            "fps": 1e3 / mean(frame["frame_ms"] for frame in frames),
+            "frame_ms": mean(frame["frame_ms"] for frame in frames),
+            "phases_ms": {name: mean(frame["phases_ms"].get(name, 0) for frame in frames) for name in names},
+            "steps_per_frame": steps / len(frames),
+            "force_evaluations_per_step":
+                sum(frame["counters"].get("force_evaluations", 0) for frame in frames) / max(steps, 1),
+            "allocated_blocks_per_frame": mean(frame["allocated_blocks"] for frame in frames),
+            "gc_collections": sum(frame["gc_collections"] for frame in frames)
+        }
+
+    def overlay_lines(self) -> list[str]:
+        summary = self.summary()
+        if not summary:
+            return ["profiling..."]
+        return [
+            f"{summary['fps']:6.1f} fps {summary['frame_ms']:7.2f} ms/frame",
+            *[f"{name:>12} {value:7.2f} ms" for name, value in summary["phases_ms"].items()],
+            f"{summary['steps_per_frame']:6.1f} steps/frame, "
+            f"{summary['force_evaluations_per_step']:.1f} force evals/step",
+            f"{summary['allocated_blocks_per_frame']:+8.0f} blocks/frame, {summary['gc_collections']} gc runs"
+        ]
+
+    def export_trace(self, path: str):
+        """ Write the recorded phases in the Chrome trace event format """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock:
+            events = list(self.events)
+        pid = os.getpid()
+        with open(path, "w") as f:
+            json.dump({
+                "displayTimeUnit": "ms",
+                "traceEvents": [{
+                    "name": name,
+                    "cat": "solarpy",
+                    "ph": "X",
+                    "ts": start / 1e3,
+                    "dur": (end - start) / 1e3,
+                    "pid": pid,
+                    "tid": tid
+                } for name, tid, start, end in events]
+            }, f)
+
+
+PROFILER = Profiler()
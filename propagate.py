@@ -0,0 +1,134 @@
+"""
+Headless batch propagation of the Solar system, without a display or pygame
+"""
+
+import json
+import julian
+import os
+import sys
+import time
+from solarsystem import SolarSystem
+from trajectory import TrajectoryWriter
+
+
+class JsonLinesWriter:
+    """ Streams snapshots into a single file, one JSON object per line """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, "w")
+
+    def write(self, system: SolarSystem):
+        self.file.write(json.dumps({
+            "date": system.get_date(),
+            "planets": [{
+                "name": planet.name,
+                "position": planet.position[:3].tolist(),
+                "velocity": planet.velocity[:3].tolist()
+            } for planet in system.planets]
+        }) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def propagate(start_date: str, end_date: str, dt=24, cadence=24, output="output/trajectory.bin",
+              integrator="rk4", use_horizons=False, writer=None, integrator_options=None, catalog=None) -> int:
+    """
+    Integrate from start_date up to and including end_date (YYYY-MM-DD) with step dt, writing a snapshot every
+    cadence hours (both in hours). Output ending in .jsonl is written as JSON lines, anything else as a binary
+    trajectory file (see trajectory.py). With an adaptive integrator dt only sets the sampling interval, the
+    internal step size is chosen by the integrator. Objects of an element catalog (see catalog.py) are added
+    as test particles and written after the planets in binary output. Returns the number of snapshots written.
+    """
+    if cadence % dt != 0:
+        raise ValueError(f"Output cadence ({cadence}h) must be a multiple of dt ({dt}h)")
+    steps_per_output = cadence // dt
+
+    system = SolarSystem(start_date=start_date, use_horizons=use_horizons, integrator=integrator, traces=False,
+                         integrator_options=integrator_options, keyframe_interval=0)  # headless runs never seek
+    names = [planet.name for planet in system.planets]
+    if catalog:
+        import catalog as catalogs
+        particle_names, states = catalogs.load_catalog(catalog, system.julian_date())
+        system.add_particles(states[:, :3], states[:, 3:])
+        names += particle_names
+
+    total_steps = round((julian.parse_date(end_date) - system.start_julian_date) * 24) // dt
+    if total_steps < 0:
+        raise ValueError(f"End date {end_date} is before start date {start_date}")
+
+    if writer is None and output.endswith(".jsonl"):
+        writer = JsonLinesWriter(output)
+    elif writer is None:
+        writer = TrajectoryWriter(output, names, metadata={
+            "start_date": start_date, "dt": dt, "cadence": cadence, "integrator": integrator
+        })
+    snapshots = 0
+    with writer:
+        for step in range(total_steps + 1):
+            if step % steps_per_output == 0:
+                writer.write(system)
+                snapshots += 1
+            if step < total_steps:
+                system.update_rk(dt=dt)
+    return snapshots
+
+
+def main(argv=None):
+    start_date = None
+    end_date = None
+    dt = 24  # in hours
+    cadence = None  # in hours, defaults to dt
+    output = "output/trajectory.bin"
+    integrator = "rk4"
+    use_horizons = False
+    integrator_options = {}
+    catalog = None
+
+    for i in argv if argv is not None else sys.argv[1:]:
+        arg, *val = i.split("=")
+        if arg == "--start":
+            start_date = val[0]
+        if arg == "--end":
+            end_date = val[0]
+        if arg == "--dt":
+            dt = int(val[0])
+        if arg == "--cadence":
+            cadence = int(val[0])
+        if arg == "--output":
+            output = val[0]
+        if arg == "--integrator":
+            integrator = val[0]
+        if arg == "--horizons":
+            use_horizons = True
+        if arg == "--catalog":
+            catalog = val[0]
+        if arg == "--atol" or arg == "--rtol":
+            integrator_options[arg[2:]] = float(val[0])
+        if arg == "--force":
+            integrator_options["force"] = val[0]
+        if arg == "--theta":
+            integrator_options["force_options"] = {"theta": float(val[0])}
+
+    if not start_date or not end_date:
+        print("Headless mode requires both --start=<date> and --end=<date>")
+        exit(1)
+
+    began = time.perf_counter()
+    snapshots = propagate(start_date, end_date, dt, cadence or dt, output, integrator, use_horizons,
+                          integrator_options=integrator_options, catalog=catalog)
+    elapsed = time.perf_counter() - began
+    days = julian.parse_date(end_date) - julian.parse_date(start_date)
+    print(f"Wrote {snapshots} snapshots to {output} in {elapsed:.2f}s ({days / max(elapsed, 1e-9):.0f} days/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Regression harness comparing planet trajectories produced by different update modes and integrators
+"""
+
+import constants
+import forces
+import sys
+import tracemalloc
+import numpy as np
+from solarsystem import SolarSystem
+
+CONFIGURATIONS = {
+    "sequential": dict(update_mode="sequential"),
+    "simultaneous": dict(update_mode="simultaneous"),
+    "rk4": dict(integrator="rk4"),
+    "rk4-jit": dict(integrator="rk4-jit"),
+}
+PREALLOCATED = ["sequential", "simultaneous", "rk4-jit"]  # configurations stepping against scratch buffers only
+UNBUFFERED = "rk4"  # negative control, creates temporary arrays in every step
+
+
+def compare_update_modes(start_date: str, days: int, dt=24, reference="sequential", candidates=None) -> dict:
+    """ Run every configuration for the given number of days and return max position deviation (AU) per planet """
+    candidates = candidates or [name for name in CONFIGURATIONS if name != reference]
+    systems = {name: SolarSystem(start_date, **CONFIGURATIONS[name]) for name in [reference] + candidates}
+    deviations = {name: np.zeros(len(systems[reference].planets)) for name in candidates}
+    for _ in range(days * 24 // dt):
+        for system in systems.values():
+            system.update_rk(dt=dt)
+        for name in candidates:
+            diff = np.linalg.norm(systems[name].positions[1:, :3] - systems[reference].positions[1:, :3], axis=1)
+            np.maximum(deviations[name], diff, out=deviations[name])
+    return deviations
+
+
+def step_allocations(system: SolarSystem, steps=100, dt=24, warmup=5) -> int:
+    """ Largest number of bytes held by allocations made within a single steady-state update_rk call """
+    for _ in range(warmup):
+        system.update_rk(dt=dt)
+    tracemalloc.start()
+    peak = 0
+    for _ in range(steps):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        system.update_rk(dt=dt)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return peak
+
+
+def force_cases(start_date: str) -> dict:
+    """
+    (positions, masses) of the Sun and planets, and of a close pair: Phobos 6.3e-5 AU from Mars, much closer than
+    the deepest cells of a Barnes-Hut tree over the Solar system
+    """
+    system = SolarSystem(start_date, traces=False, keyframe_interval=0)
+    positions, masses = system.positions[:, :3], system.masses
+    mars, phobos = positions[4], positions[4] + [6.3e-5, 0, 0]
+    return {
+        "planets": (positions, masses),
+        "close pair": (np.array([positions[0], mars, phobos, positions[5], positions[9]]),
+                       np.array([masses[0], masses[4], 1.0659e16, masses[5], masses[9]]))
+    }
+
+
+def force_errors(start_date: str, theta=0.5) -> dict:
+    """ Largest relative acceleration error of Barnes-Hut against direct summation per case, exact and at theta """
+    return {(name, t): forces.force_accuracy(forces.BarnesHut(theta=t), *case)["max"]
+            for name, case in force_cases(start_date).items() for t in (0.0, theta)}
+
+
+def main():
+    start_date = "2000-01-01"
+    days = 365
+    dt = 24
+    reference = "sequential"
+    candidates = None
+    tolerance = None
+    max_step_bytes = 640  # a few hundred bytes of transient Python objects remain
+    theta = 0.5
+    force_tolerance = 1e-2
+
+    for i in sys.argv[1:]:
+        arg, *val = i.split("=")
+        if arg == "--start":
+            start_date = val[0]
+        if arg == "--days":
+            days = int(val[0])
+        if arg == "--dt":
+            dt = int(val[0])
+        if arg == "--reference":
+            reference = val[0]
+        if arg == "--candidates":
+            candidates = val[0].split(",")
+        if arg == "--tolerance":
+            tolerance = float(val[0])
+        if arg == "--allocations":
+            max_step_bytes = int(val[0])
+        if arg == "--theta":
+            theta = float(val[0])
+        if arg == "--force-tolerance":
+            force_tolerance = float(val[0])
+
+    deviations = compare_update_modes(start_date, days, dt, reference, candidates)
+    failed = False
+    for name, deviation in deviations.items():
+        print(f"{reference} vs {name}: max deviation {deviation.max():.3e} AU")
+        for k, value in enumerate(deviation):
+            print(f"    {constants.planets_names[k]:>12}: {value:.3e} AU")
+        if tolerance is not None and deviation.max() > tolerance:
+            failed = True
+    for name in PREALLOCATED + [UNBUFFERED]:
+        # without keyframes, which copy the state every keyframe_interval days
+        allocated = step_allocations(SolarSystem(start_date, keyframe_interval=0, **CONFIGURATIONS[name]), dt=dt)
+        print(f"{name}: a steady-state step allocates up to {allocated} bytes")
+        # the control has to exceed the budget, otherwise the budget wouldn't catch temporary arrays either
+        if (allocated > max_step_bytes) != (name == UNBUFFERED):
+            failed = True
+    for (name, t), error in force_errors(start_date, theta).items():
+        print(f"barnes-hut theta={t} ({name}): max relative error {error:.3e}")
+        if error > (1e-12 if t == 0 else force_tolerance):
+            failed = True
+    exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from solarsystem import SolarSystem
 from geometry import *
+from profiler import PROFILER
 import pygame
 import numpy as np
 
@@ -18,6 +19,12 @@ class Renderer:
         self.angle_horizontal = 0
         self.scale = 1
         self.mvp = None
+
+        # Reused between frames: the frame surface, the grid layer (valid until the camera or window size changes)
+        # and the label texts, which never change
+        self.surface = None
+        self.grid_layer = None
+        self.labels: dict[str, pygame.Surface] = {}
         self.calc_matrices()
 
     def handle_events(self, event: pygame.event.Event):
@@ -74,26 +81,50 @@ class Renderer:
                 projection_matrix
             )
         )
+        self.grid_layer = None
+
+    def label(self, text: str) -> pygame.Surface:
+        if text not in self.labels:
+            self.labels[text] = self.font.render(text, True, pygame.Color("yellow"))
+        return self.labels[text]
 
-    def render(self, system: SolarSystem, size=None) -> pygame.Surface:
+    def render(self, system: SolarSystem, size=None, positions=None) -> pygame.Surface:
+        """
+        Render the system; the returned surface is reused and overwritten by the next call. Planets are drawn at
+        the given (9, 4) positions if passed (e.g. interpolated snapshots), otherwise at their current positions.
+        """
         width, height = size if size else pygame.display.get_surface().get_size()
-        surface = pygame.Surface(size=(width, height))
-        surface.fill(pygame.Color("black"))
+        if self.surface is None or self.surface.get_size() != (width, height):
+            self.surface = pygame.Surface(size=(width, height))
+        surface = self.surface
 
-        self.render_grid(surface)
+        if self.grid_layer is None or self.grid_layer.get_size() != (width, height):
+            with PROFILER.phase("render_grid"):
+                self.grid_layer = pygame.Surface(size=(width, height))
+                self.grid_layer.fill(pygame.Color("black"))
+                self.render_grid(self.grid_layer)
+        surface.blit(self.grid_layer, (0, 0))
 
-        # Draw traces
+        # Project all trace points and planets at once, then split them back per planet
+        traces = []
         for i, planet in enumerate(system.planets):
-            pygame.draw.lines(
-                surface=surface,
-                color=pygame.Color("darkgray"),
-                closed=False,
-                points=[
-                    (perspective_divide(np.matmul(pt, self.mvp)) + 1) * np.array([width // 2, height // 2])
-                    for pt in [planet.trace[0]] + planet.trace[i * i + 1::i * i + 1] + [planet.trace[-1]]
-                ],
-                width=2
-            )
+            trace = planet.trace.view()
+            traces.extend((trace[:1], trace[i * i + 1::i * i + 1], trace[-1:]))
+        positions = system.positions[1:len(system.planets) + 1] if positions is None else positions
+        points = project(np.concatenate(traces + [positions]), self.mvp, (width, height))
+        trace_lengths = [sum(len(part) for part in traces[3 * i:3 * i + 3]) for i in range(len(system.planets))]
+        *trace_points, planet_points = np.split(points, np.cumsum(trace_lengths))
+
+        # Draw traces
+        with PROFILER.phase("traces"):
+            for planet_trace in trace_points:
+                pygame.draw.lines(
+                    surface=surface,
+                    color=pygame.Color("darkgray"),
+                    closed=False,
+                    points=planet_trace.tolist(),
+                    width=2
+                )
 
         # Draw the Sun
         pygame.draw.circle(
@@ -102,49 +133,50 @@ class Renderer:
             center=(width // 2, height // 2),
             radius=7 * self.scale + 3
         )
-        surface.blit(
-            source=(rendered_text := self.font.render("Sun", True, pygame.Color("yellow"))),
-            dest=(width // 2 - rendered_text.get_width() // 2, height // 2 + 7 * self.scale + 3)
-        )
+        with PROFILER.phase("fonts"):
+            surface.blit(
+                source=(rendered_text := self.label("Sun")),
+                dest=(width // 2 - rendered_text.get_width() // 2, height // 2 + 7 * self.scale + 3)
+            )
 
         # Draw planets
-        for planet in system.planets:
-            position = ((perspective_divide(np.matmul(planet.position, self.mvp)) + 1)
-                        * np.array([width // 2, height // 2]))
+        for planet, position in zip(system.planets, planet_points.tolist()):
             pygame.draw.circle(
                 surface=surface,
                 color=pygame.Color("white"),
                 center=position,
                 radius=4 * self.scale + 3
             )
-            surface.blit(
-                source=(rendered_text := self.font.render(planet.name, True, pygame.Color("yellow"))),
-                dest=(position[0] - rendered_text.get_width() // 2, position[1] + 4 * self.scale + 3)
-            )
+            with PROFILER.phase("fonts"):
+                surface.blit(
+                    source=(rendered_text := self.label(planet.name)),
+                    dest=(position[0] - rendered_text.get_width() // 2, position[1] + 4 * self.scale + 3)
+                )
 
         return surface
 
+    def render_overlay(self, surface: pygame.Surface, lines: list[str]):
+        """ Text lines drawn over the top left corner, rendered every call since they change every frame """
+        for k, line in enumerate(lines):
+            text = self.font.render(line, True, pygame.Color("white"), pygame.Color("black"))
+            surface.blit(text, (8, 8 + k * (text.get_height() + 2)))
+
     def render_grid(self, surface: pygame.Surface):
         width, height = surface.get_size()
         grid_size = min(int(4 / self.scale) + 2, 50)
-        for i in range(-grid_size, grid_size + 1, 1):
-            start = ((perspective_divide(np.matmul(np.array([-grid_size, i, 0, 1]), self.mvp)) + 1)
-                     * np.array([width // 2, height // 2]))
-            end = ((perspective_divide(np.matmul(np.array([grid_size, i, 0, 1]), self.mvp)) + 1)
-                   * np.array([width // 2, height // 2]))
-            pygame.draw.line(
-                surface=surface,
-                color=pygame.Color(165, 42, 42) if self.angle_vertical > - np.pi / 4 else pygame.Color(64, 64, 64),
-                start_pos=start,
-                end_pos=end
-            )
-            start = ((perspective_divide(np.matmul(np.array([i, -grid_size, 0, 1]), self.mvp)) + 1)
-                     * np.array([width // 2, height // 2]))
-            end = ((perspective_divide(np.matmul(np.array([i, grid_size, 0, 1]), self.mvp)) + 1)
-                   * np.array([width // 2, height // 2]))
-            pygame.draw.line(
-                surface=surface,
-                color=pygame.Color(61, 145, 64) if self.angle_vertical > - np.pi / 4 else pygame.Color(64, 64, 64),
-                start_pos=start,
-                end_pos=end
-            )
+
+        # Endpoints of lines along x (start, end) followed by lines along y (start, end), projected at once
+        steps = np.arange(-grid_size, grid_size + 1)
+        endpoints = np.zeros((4, len(steps), 4))
+        endpoints[:, :, 3] = 1
+        endpoints[0, :, 0], endpoints[0, :, 1] = -grid_size, steps
+        endpoints[1, :, 0], endpoints[1, :, 1] = grid_size, steps
+        endpoints[2, :, 0], endpoints[2, :, 1] = steps, -grid_size
+        endpoints[3, :, 0], endpoints[3, :, 1] = steps, grid_size
+        x_start, x_end, y_start, y_end = project(endpoints.reshape(-1, 4), self.mvp, (width, height)).reshape(4, -1, 2)
+
+        x_color = pygame.Color(165, 42, 42) if self.angle_vertical > - np.pi / 4 else pygame.Color(64, 64, 64)
+        y_color = pygame.Color(61, 145, 64) if self.angle_vertical > - np.pi / 4 else pygame.Color(64, 64, 64)
+        for xs, xe, ys, ye in zip(x_start.tolist(), x_end.tolist(), y_start.tolist(), y_end.tolist()):
+            pygame.draw.line(surface=surface, color=x_color, start_pos=xs, end_pos=xe)
+            pygame.draw.line(surface=surface, color=y_color, start_pos=ys, end_pos=ye)
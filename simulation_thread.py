@@ -0,0 +1,73 @@
+"""
+Background stepping of a SolarSystem, decoupled from the render loop
+"""
+
+import collections
+import threading
+import time
+import numpy.typing as npt
+from solarsystem import SolarSystem
+
+
+class SimulationThread(threading.Thread):
+    """
+    Advances the system at `speed` simulated days per wall-clock second and publishes snapshots of planet positions.
+    Anything that reads or modifies the system from another thread must hold `lock`; the render loop draws
+    positions interpolated between the last two snapshots, so it stays smooth regardless of the step rate.
+    """
+
+    def __init__(self, system: SolarSystem, dt=24, speed=120.0, max_lag=0.25, max_batch_time=0.005):
+        super().__init__(daemon=True)
+        self.system = system
+        self.dt = dt  # in hours
+        self.speed = speed  # in days per second
+        self.paused = True
+        self.max_lag = max_lag  # seconds of simulation time that may be owed before steps are dropped
+        self.max_batch_time = max_batch_time  # seconds the lock is held for a batch of steps at most
+        self.lock = threading.Lock()
+        self.snapshots = collections.deque(maxlen=2)
+        self.running = True
+        self.steps_per_second = 0.0
+        self.publish(reset=True)
+
+    def publish(self, reset=False):
+        """ Record the current positions as the latest snapshot; reset drops the previous one (after jumps) """
+        snapshot = (time.perf_counter(), self.system.positions[1:len(self.system.planets) + 1].copy())
+        if reset:
+            self.snapshots.clear()
+            self.snapshots.append(snapshot)
+        self.snapshots.append(snapshot)
+
+    def interpolated_positions(self) -> npt.NDArray[float]:
+        """ Planet positions one snapshot behind the simulation, interpolated to the current wall-clock time """
+        (t0, p0), (t1, p1) = self.snapshots
+        if t1 <= t0:
+            return p1
+        alpha = min(1.0, (time.perf_counter() - t1) / (t1 - t0))
+        return p0 + (p1 - p0) * alpha
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+    def run(self):
+        last = time.perf_counter()
+        due = 0.0  # steps owed to keep up with the requested speed
+        while self.running:
+            now = time.perf_counter()
+            if not self.paused:
+                due = min(due + (now - last) * self.speed * 24 / self.dt, self.max_lag * self.speed * 24 / self.dt)
+            last = now
+            if due < 1:
+                time.sleep(0.001)
+                continue
+
+            steps = 0
+            with self.lock:
+                began = time.perf_counter()
+                while steps < int(due) and time.perf_counter() - began < self.max_batch_time:
+                    self.system.update_rk(dt=self.dt)
+                    steps += 1
+                self.publish()
+            due -= steps
+            self.steps_per_second = steps / max(time.perf_counter() - began, 1e-9)
@@ -1,104 +1,499 @@
 import constants
+import initial_state
 import numpy as np
 import numpy.typing as npt
-import datetime
+import json
+import julian
+import kernels
+import os
+from profiler import PROFILER
+
+
+class Trace:
+    """
+    Fixed-capacity history of homogeneous positions with O(1) append. Every point is written twice, capacity
+    rows apart, so the points in chronological order are always one contiguous slice of the buffer.
+    """
+
+    def __init__(self, capacity: int, points):
+        self.capacity = max(2, int(capacity))
+        self.buffer = np.empty((2 * self.capacity, 4))
+        self.load(points)
+
+    def load(self, points):
+        """ Replace the history with the given points (oldest first), keeping at most capacity of them """
+        points = np.asarray(points, dtype=float)[-self.capacity:]
+        self.count = len(points)
+        self.start = 0
+        self.buffer[:self.count] = points
+        self.buffer[self.capacity:self.capacity + self.count] = points
+
+    def append(self, point):
+        end = (self.start + self.count) % self.capacity
+        self.buffer[end] = point
+        self.buffer[end + self.capacity] = point
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def view(self) -> npt.NDArray[float]:
+        """ (count, 4) view of the points in chronological order, valid until the next append """
+        return self.buffer[self.start:self.start + self.count]
+
+    def __len__(self):
+        return self.count
+
+
+class Bodies:
+    """
+    Registry of all bodies as a struct of arrays: integer ids, names, masses, homogeneous (N, 4) positions and
+    velocities, and the traces of bodies that keep one. A body's id is its row in every array.
+    """
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=int)
+        self.names: list[str] = []
+        self.positions = np.zeros((0, 4))
+        self.velocities = np.zeros((0, 4))
+        self.masses = np.zeros(0)
+        self.max_trace_lens = np.zeros(0)
+        self.traces: list[Trace | None] = []
+
+    def add(self, names: list[str], positions, velocities, masses, traces=False, index=None) -> npt.NDArray[int]:
+        """
+        Append bodies with (M, 3) positions (AU), velocities (AU/day) and masses (kg), or insert them before row
+        index, returning their ids. The arrays are reallocated and the ids of bodies after index shift, so views
+        into them have to be taken again.
+        """
+        count = len(positions)
+        index = len(self.ids) if index is None else index
+        ids = np.arange(index, index + count)
+        rows = np.zeros((count, 4))
+        rows[:, :3] = positions
+        rows[:, 3] = 1
+        self.positions = np.insert(self.positions, [index], rows, axis=0)
+        rows = np.zeros((count, 4))
+        rows[:, :3] = velocities
+        self.velocities = np.insert(self.velocities, [index], rows, axis=0)
+        self.masses = np.insert(self.masses, [index], np.broadcast_to(np.asarray(masses, dtype=float), count))
+        self.max_trace_lens = np.insert(self.max_trace_lens, [index], np.zeros(count))
+        self.ids = np.arange(len(self.ids) + count)
+        self.names[index:index] = list(names)
+        self.traces[index:index] = [Trace(2, [row, row]) for row in self.positions[ids]] if traces else [None] * count
+        return ids
+
+    def __len__(self):
+        return len(self.ids)
 
 
 class Astrobject:
-    def __init__(self, name: str, position: npt.NDArray[float], velocity: npt.NDArray[float]):
-        self.name = name
-        self.position = position
-        self.velocity = velocity
-        self.mass = 0
-        self.trace = [np.array(position), np.array(position)]
-        self.max_trace_len = 0
-
-    def accelerate(self, astro_objects):
-        a = np.zeros(3)
-        for ao in astro_objects:
-            if ao.name == self.name or ao.name == 'sun':
-                continue
-            dx = ao.position[0:3] - self.position[0:3]
-            dsq = np.sum(np.square(dx[0:3]))
-            dr = np.sqrt(dsq)
-            force = constants.GRAV_CONSTANT * ao.mass / dsq
-            a = a + dx[0:3] * (force / dr)
-        return a
-
-    def initial_derivative(self, astro_objects):
-        a = self.accelerate(astro_objects)
-        return Derivative(self.velocity[0:3], a)
-
-    def next_derivative(self, astro_objects, temp, derivative, dt):
-        temp.position = self.position[0:3] + derivative.dx * dt
-        temp.velocity = self.velocity[0:3] + derivative.dvx * dt
-        a = temp.accelerate(astro_objects)
-        return Derivative(temp.velocity[0:3], a)
-
-    def update_planet(self, planets, sun, dt):
-        temp = Astrobject(self.name, np.zeros(3), np.zeros(3))
-        astro_objects = planets.copy()
-        astro_objects.append(sun)
-        k1 = self.initial_derivative(astro_objects)
-        k2 = self.next_derivative(astro_objects, temp, k1, dt * 0.5)
-        k3 = self.next_derivative(astro_objects, temp, k2, dt * 0.5)
-        k4 = self.next_derivative(astro_objects, temp, k3, dt)
-        kx = np.column_stack((k1.dx, k2.dx, k3.dx, k4.dx))
-        kvx = np.column_stack((k1.dvx, k2.dvx, k3.dvx, k4.dvx))
-        q = np.array([1 / 6, 1 / 3, 1 / 3, 1 / 6])
-        dx_dt = np.array([np.sum(kx[0] * q), np.sum(kx[1] * q), np.sum(kx[2] * q)])
-        dvx_dt = np.array([np.sum(kvx[0] * q), np.sum(kvx[1] * q), np.sum(kvx[2] * q)])
-        self.position[0:3] += dx_dt * dt
-        self.velocity[0:3] += dvx_dt * dt
+    """ Lightweight view of one body of a Bodies registry, all of its state lives in the registry's arrays """
+    __slots__ = ("bodies", "id")
+
+    def __init__(self, bodies: Bodies, id: int):
+        self.bodies = bodies
+        self.id = id
+
+    @property
+    def name(self) -> str:
+        return self.bodies.names[self.id]
+
+    @property
+    def position(self) -> npt.NDArray[float]:
+        return self.bodies.positions[self.id]
+
+    @property
+    def velocity(self) -> npt.NDArray[float]:
+        return self.bodies.velocities[self.id]
+
+    @property
+    def mass(self) -> float:
+        return self.bodies.masses[self.id]
+
+    @property
+    def trace(self) -> Trace:
+        return self.bodies.traces[self.id]
+
+    @property
+    def max_trace_len(self):
+        return self.bodies.max_trace_lens[self.id]
+
+    @max_trace_len.setter
+    def max_trace_len(self, value):
+        """ Resizing the trace keeps its most recent points """
+        self.bodies.max_trace_lens[self.id] = value
+        self.bodies.traces[self.id] = Trace(value, self.trace.view())
 
     def update_trace(self):
-        self.trace.append(np.array(self.position))
-        if len(self.trace) > self.max_trace_len:
-            self.trace.pop(0)
+        self.trace.append(self.position)
 
 
-class Derivative:
-    def __init__(self, dx, dvx):
-        self.dx = dx
-        self.dvx = dvx
+class StepBuffers:
+    """
+    Views of the massive bodies' rows of the shared state arrays together with the scratch arrays of the per-planet
+    Runge-Kutta updates, allocated once and reused by every step through in-place operations
+    """
+
+    def __init__(self, positions, velocities, masses, n):
+        # Per-planet updates work on whole homogeneous rows, which keeps every operand contiguous: the w components
+        # of offsets and velocities are zero, so they don't affect distances and positions keep w = 1
+        self.positions = positions[:n]
+        self.velocities = velocities[:n]
+        self.masses = masses[:n]
+        self.rows = [(positions[k], velocities[k]) for k in range(n)]
+        self.positions3 = positions[:n, :3]
+        self.velocities3 = velocities[:n, :3]
+        self.fixed = np.arange(n) == 0  # the Sun stays at the origin
+        self.gm = np.empty(n)
+        self.ones = np.ones((n, 1))
+        self.ones4 = np.ones(4)
+        self.offsets = np.empty((n, 4))
+        self.squares = np.empty((n, 4))
+        self.factors = np.empty(n)
+        self.distances = np.empty(n)
+        self.x0, self.v0, self.x, self.kx, self.kv, self.sx, self.sv = np.zeros((7, 4))
+        self.x0_row, self.x_row = self.x0[np.newaxis], self.x[np.newaxis]
+        # Stage coefficients as 0-d arrays, so that no scalars are converted to arrays in the loop
+        self.half, self.full, self.sixth = np.zeros(()), np.zeros(()), np.zeros(())
+        self.one, self.two = np.ones(()), np.full((), 2.0)
+        self.rk4 = np.zeros((kernels.BUFFERS, n, 3))
 
 
 class SolarSystem:
-    def __init__(self, start_date, use_horizons=False):
-        self.sun = Astrobject(name="Sun", position=np.array([0, 0, 0, 1]), velocity=np.zeros(4))
-        self.sun.mass = constants.sun_mass
-        self.planets: list[Astrobject] = []
+    UPDATE_MODES = ["sequential", "simultaneous"]
+
+    def __init__(self, start_date, use_horizons=False, integrator=None, update_mode="sequential", traces=True,
+                 integrator_options=None, ephemeris=False, keyframe_interval=365, max_keyframes=32, dt=24):
+        # Time is kept as the Julian date at 0h of the start date and the whole hours elapsed since then
+        self.start_julian_date = julian.parse_date(start_date)
+        self.hours = 0
         if use_horizons:
             import initial_state_astroquery
-            planets = initial_state_astroquery.load_data(start_date)
+            planets = initial_state_astroquery.load_data(self.start_julian_date)
         else:
-            import initial_state
-            planets = initial_state.load_data(start_date)
-        for planet in planets:
-            self.planets.append(Astrobject(
-                name=planet["name"],
-                position=np.array(planet["position"] + [1]),
-                velocity=np.array(planet["velocity"] + [0])
-            ))
+            planets = initial_state.load_data(self.start_julian_date)
+
+        # All state lives in the registry's shared arrays: Sun, planets, added massive bodies, then test particles
+        self.bodies = Bodies()
+        self.sun = Astrobject(self.bodies, self.bodies.add(["Sun"], np.zeros((1, 3)), np.zeros((1, 3)),
+                                                           constants.sun_mass)[0])
+        ids = self.bodies.add([planet["name"] for planet in planets], [planet["position"] for planet in planets],
+                              [planet["velocity"] for planet in planets],
+                              np.array(constants.planets_mass) * (10 ** 24), traces=True)
+        self.planets = [Astrobject(self.bodies, id) for id in ids]
         planet_trace = [88, 225, 366, 688, 11.9*366, 29.5*366, 84*366, 164.8*366, 247.7*366]
         for i in range(9):
-            self.planets[i].mass = constants.planets_mass[i] * (10 ** 24)
             self.planets[i].max_trace_len = planet_trace[i] // max(1, i - 2)
+        self.n_massive = len(self.planets) + 1  # Sun, planets and added massive bodies come before test particles
+        self.bind_views()
 
-        year, month, day = [int(i) for i in start_date.split("-")]
-        self.start_date = datetime.datetime(year, month, day)
-        self.date = datetime.datetime(year, month, day)
+        if update_mode not in self.UPDATE_MODES:
+            raise ValueError(f"Unknown update mode '{update_mode}', expected one of: {', '.join(self.UPDATE_MODES)}")
+        self.update_mode = update_mode
+        self.traces = traces  # headless runs don't need trace history
+        self.ephemeris = ephemeris  # evaluate planets from Keplerian elements instead of integrating
+        self.integrator = None
+        self.integrator_options = {}
+        if integrator is not None:
+            self.set_integrator(integrator, **(integrator_options or {}))
 
-    def update_rk(self, dt=24):
-        """ Update planet positions using Runge Kutta method """
+        self.dt = dt  # step in hours, used by default and when integrating towards a seek target
+        if self.ephemeris:
+            self.update_ephemeris(self.julian_date())
+
+        # In-memory checkpoints taken every keyframe_interval days, keyed by hours since the start, used to seek
+        # without integrating from the start. Beyond max_keyframes every other one is dropped and the spacing of
+        # new ones doubles, so long runs keep evenly spaced keyframes instead of an ever growing number of them.
+        self.keyframe_interval = keyframe_interval
+        self.max_keyframes = max_keyframes
+        self.keyframes: dict[int, dict] = {}
+        self.reset_keyframes()
+
+    def set_integrator(self, integrator, **options):
+        """
+        Use a whole-system integrator (name or Integrator instance), None for per-planet updates.
+        Options, such as atol and rtol of adaptive integrators, are passed to the integrator created by name.
+        """
+        if isinstance(integrator, str):
+            import integrator as integrators
+            fixed = np.arange(len(self.masses)) == 0  # the Sun stays at the origin
+            integrator = integrators.create_integrator(integrator, self.masses, fixed, n_massive=self.n_massive,
+                                                       **options)
+        self.integrator = integrator
+        self.integrator_options = options
+
+    @property
+    def positions(self) -> npt.NDArray[float]:
+        return self.bodies.positions
+
+    @property
+    def velocities(self) -> npt.NDArray[float]:
+        return self.bodies.velocities
+
+    @property
+    def masses(self) -> npt.NDArray[float]:
+        return self.bodies.masses
+
+    def bind_views(self):
+        """ (Re)create the views into the registry's arrays, needed whenever bodies are added """
+        n = self.n_massive
+        self.particle_positions = self.positions[n:]
+        self.particle_velocities = self.velocities[n:]
+        self.buffers = StepBuffers(self.positions, self.velocities, self.masses, n)
+
+    def add_bodies(self, names: list[str], positions: npt.NDArray[float], velocities: npt.NDArray[float],
+                   masses: npt.NDArray[float]):
+        """
+        Add massive bodies, such as moons or large asteroids, with heliocentric positions (AU) and velocities
+        (AU/day), both (M, 3), and masses (kg). They are stored after the planets and before any test particles,
+        interact with every other massive body through the integrator's force backend (e.g. Barnes-Hut for many
+        bodies), and require a vectorized integrator. Only the planets are drawn and keep traces.
+        """
+        if self.integrator is None or self.ephemeris:
+            raise ValueError("Additional massive bodies require a vectorized integrator")
+        self.bodies.add(names, positions, velocities, masses, index=self.n_massive)
+        self.n_massive += len(positions)
+        self.bind_views()
+        self.set_integrator(self.integrator.name, **self.integrator_options)
+        self.reset_keyframes()
+
+    def add_particles(self, positions: npt.NDArray[float], velocities: npt.NDArray[float]):
+        """
+        Add massless test particles with heliocentric positions (AU) and velocities (AU/day), both (M, 3).
+        They are stored after all massive bodies in the shared state arrays, so particle_positions and
+        particle_velocities are contiguous (M, 4) blocks, and they require a vectorized integrator.
+        """
+        if self.integrator is None or self.ephemeris:
+            raise ValueError("Test particles require a vectorized integrator")
+        self.bodies.add([""] * len(positions), positions, velocities, 0.0)
+        self.bind_views()
+        self.set_integrator(self.integrator.name, **self.integrator_options)
+        # Earlier keyframes don't hold the particles, seeking starts over from the current state
+        self.reset_keyframes()
+
+    def update_rk(self, dt=None):
+        """
+        Update planet positions using Runge Kutta method, by dt hours (the system's step by default). In sequential
+        mode each planet sees the already advanced positions of the planets before it, in simultaneous mode every
+        stage of every planet is computed from a common snapshot and all planets are committed at once.
+        """
+        dt = self.dt if dt is None else dt
+        evaluations = self.integrator.force_evaluations if self.integrator is not None else 0
+        with PROFILER.phase("update_rk"):
+            if self.ephemeris:
+                self.update_ephemeris(self.julian_date() + dt / 24)
+            elif self.integrator is not None:
+                self.integrator.step(self.positions[:, :3], self.velocities[:, :3], dt/24)
+            elif self.update_mode == "simultaneous":
+                self.update_simultaneous(dt/24)
+            else:
+                self.update_sequential(dt/24)
+            if self.traces and self.hours % 24 == 0:
+                days = self.hours // 24
+                for i, planet in enumerate(self.planets):
+                    if days % max(1, i - 2) == 0:
+                        planet.update_trace()
+        if PROFILER.enabled:
+            PROFILER.count("steps")
+            # per-planet modes evaluate the forces on the whole system once per Runge-Kutta stage
+            PROFILER.count("force_evaluations", self.integrator.force_evaluations - evaluations
+                           if self.integrator is not None else 0 if self.ephemeris else 4)
+        self.hours += dt
+        if self.keyframe_interval and self.hours >= self.next_keyframe:
+            self.store_keyframe()
+
+    def acceleration(self, index: int, position_row: npt.NDArray[float], out: npt.NDArray[float]):
+        """ Acceleration of massive body `index` moved to the (1, 4) position, caused by all other massive bodies """
+        b = self.buffers
+        np.dot(b.ones, position_row, out=b.offsets)
+        np.subtract(b.positions, b.offsets, out=b.offsets)
+        np.multiply(b.offsets, b.offsets, out=b.squares)
+        np.dot(b.squares, b.ones4, out=b.factors)
+        b.factors[index] = 1.0
+        np.sqrt(b.factors, out=b.distances)
+        np.multiply(b.factors, b.distances, out=b.factors)
+        np.divide(b.gm, b.factors, out=b.factors)
+        b.factors[index] = 0.0
+        np.dot(b.factors, b.offsets, out=out)
+
+    def update_sequential(self, dt):
+        """ Runge-Kutta step of one planet after another, every planet sees the already advanced ones before it """
+        b = self.buffers
+        np.multiply(b.masses, constants.GRAV_CONSTANT, out=b.gm)
+        b.half[()], b.full[()], b.sixth[()] = dt * 0.5, dt, dt / 6
+        for index in range(1, len(b.rows)):
+            position, velocity = b.rows[index]
+            np.copyto(b.x0, position)
+            np.copyto(b.v0, velocity)
+            np.copyto(b.kx, b.v0)
+            self.acceleration(index, b.x0_row, b.kv)
+            np.copyto(b.sx, b.kx)
+            np.copyto(b.sv, b.kv)
+            for stage in range(3):
+                c = b.full if stage == 2 else b.half
+                np.multiply(b.kx, c, out=b.x)
+                b.x += b.x0
+                np.multiply(b.kv, c, out=b.kx)
+                b.kx += b.v0
+                self.acceleration(index, b.x_row, b.kv)
+                w = b.one if stage == 2 else b.two  # the stage position in x is no longer needed
+                b.sx += np.multiply(b.kx, w, out=b.x)
+                b.sv += np.multiply(b.kv, w, out=b.x)
+            position += np.multiply(b.sx, b.sixth, out=b.sx)
+            velocity += np.multiply(b.sv, b.sixth, out=b.sv)
+
+    def update_simultaneous(self, dt):
+        """ Coupled Runge-Kutta step in which no planet sees another planet's partially updated state """
+        b = self.buffers
+        kernels.rk4_step(b.positions3, b.velocities3, b.masses, len(b.masses), b.fixed, dt, b.rk4)
+
+    def julian_date(self) -> float:
+        return self.start_julian_date + self.hours / 24
+
+    def update_ephemeris(self, julian_date):
+        states = initial_state.load_states(julian_date)[0]
+        self.positions[1:, :3] = states[:, :3]
+        self.velocities[1:, :3] = states[:, 3:]
+
+    def set_date(self, date: str):
+        """
+        Jump to a date (YYYY-MM-DD). With the Keplerian ephemeris the state and traces are evaluated directly,
+        otherwise the simulation is restored from the nearest earlier keyframe and integrated up to the date.
+        """
+        target = round((julian.parse_date(date) - self.start_julian_date) * 24)
+        if not self.ephemeris:
+            self.seek(target)
+            return
+        self.hours = target
+        julian_date = self.julian_date()
+        self.update_ephemeris(julian_date)
+        if not self.traces:
+            return
         for i, planet in enumerate(self.planets):
-            planet.update_planet(self.planets, self.sun, dt/24)
-            if (self.date - self.start_date).days % max(1, i - 2) == 0 and (self.date - self.start_date).seconds == 0:
-                planet.update_trace()
-        self.date += datetime.timedelta(hours=dt)
+            every = max(1, i - 2)
+            dates = julian_date - every * np.arange(max(2, int(planet.max_trace_len)) - 1, -1, -1)
+            states = initial_state.load_states(dates, planets=[i])[:, 0]
+            planet.trace.load(np.column_stack((states[:, :3], np.ones(len(states)))))
+
+    def seek(self, target: int):
+        """
+        Integrate to target (hours since the start date) from the current state or the latest keyframe before it,
+        whichever is closer
+        """
+        keyframe = max((hours for hours in self.keyframes if hours <= target), default=None)
+        if self.hours > target or (keyframe is not None and keyframe > self.hours):
+            if keyframe is None:
+                raise ValueError(f"No keyframe before {julian.format_date(self.start_julian_date + target / 24)}, "
+                                 f"cannot integrate backwards")
+            self.restore_checkpoint(self.keyframes[keyframe])
+        while self.hours < target:
+            self.update_rk(min(self.dt, target - self.hours))  # the last step is shortened to land on target
+
+    def reset_keyframes(self):
+        """ Discard all keyframes and start over with one of the current state """
+        self.keyframes = {}
+        self.keyframe_spacing = self.keyframe_interval
+        self.store_keyframe()
+
+    def store_keyframe(self):
+        if self.keyframe_interval:
+            self.keyframes[self.hours] = self.get_checkpoint(traces=False)
+            if len(self.keyframes) > self.max_keyframes:
+                for hours in sorted(self.keyframes)[1::2]:
+                    del self.keyframes[hours]
+                self.keyframe_spacing *= 2
+            self.next_keyframe = self.hours + 24 * self.keyframe_spacing
+
+    def get_checkpoint(self, traces=True) -> dict:
+        """ Complete simulation state as a dict of NumPy arrays, optionally without trace history """
+        state = self.integrator.get_state() if self.integrator is not None else {}
+        arrays = {name: value for name, value in state.items() if isinstance(value, np.ndarray)}
+        checkpoint = {
+            "metadata": np.array(json.dumps({
+                "start_date": julian.format_date(self.start_julian_date),
+                "hours": self.hours,
+                "date": self.get_date(),
+                "dt": self.dt,
+                "integrator": self.integrator.name if self.integrator is not None else None,
+                "integrator_options": self.integrator_options,
+                "integrator_state": {name: value for name, value in state.items() if name not in arrays},
+                "update_mode": self.update_mode,
+                "traces": self.traces,
+                "ephemeris": self.ephemeris,
+                "keyframe_interval": self.keyframe_interval,
+                "max_keyframes": self.max_keyframes,
+                "bodies": self.bodies.names[len(self.planets) + 1:self.n_massive]
+            })),
+            "positions": self.positions.copy(),
+            "velocities": self.velocities.copy(),
+            "masses": self.masses.copy(),
+            "max_trace_len": np.array([planet.max_trace_len for planet in self.planets]),
+            # array state of the integrator, e.g. the dense output of dopri5
+            **{f"integrator_{name}": value.copy() for name, value in arrays.items()}
+        }
+        if traces:
+            checkpoint["trace_lengths"] = np.array([len(planet.trace) for planet in self.planets])
+            checkpoint["trace_data"] = np.concatenate([planet.trace.view() for planet in self.planets])
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint: dict):
+        """ Restore a state created by get_checkpoint; traces restart at the restored position if not included """
+        metadata = json.loads(str(checkpoint["metadata"]))
+        self.hours = metadata["hours"]
+        self.dt = metadata["dt"]
+        self.positions[...] = checkpoint["positions"]
+        self.velocities[...] = checkpoint["velocities"]
+        self.masses[...] = checkpoint["masses"]
+        if self.integrator is not None:
+            self.integrator.set_state({**metadata["integrator_state"],
+                                       **{name[len("integrator_"):]: value for name, value in checkpoint.items()
+                                          if name.startswith("integrator_")}})
+        if "trace_data" in checkpoint:
+            traces = np.split(checkpoint["trace_data"], np.cumsum(checkpoint["trace_lengths"])[:-1])
+        else:
+            traces = [np.array([planet.position, planet.position]) for planet in self.planets]
+        for planet, trace, max_trace_len in zip(self.planets, traces, checkpoint["max_trace_len"]):
+            if max_trace_len != planet.max_trace_len:
+                planet.max_trace_len = max_trace_len
+            planet.trace.load(trace)
+        if self.keyframe_interval:
+            self.next_keyframe = self.hours + 24 * self.keyframe_spacing
+
+    def save_checkpoint(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **self.get_checkpoint())
+
+    @classmethod
+    def load_checkpoint(cls, path: str) -> "SolarSystem":
+        with np.load(path) as data:
+            checkpoint = dict(data)
+        metadata = json.loads(str(checkpoint["metadata"]))
+        system = cls(
+            start_date=metadata["start_date"],
+            integrator=metadata["integrator"],
+            update_mode=metadata["update_mode"],
+            traces=metadata["traces"],
+            integrator_options=metadata["integrator_options"],
+            ephemeris=metadata["ephemeris"],
+            keyframe_interval=metadata["keyframe_interval"],
+            max_keyframes=metadata["max_keyframes"],
+            dt=metadata["dt"]
+        )
+        names = metadata.get("bodies", [])
+        if names:
+            system.add_bodies(names, np.zeros((len(names), 3)), np.zeros((len(names), 3)), np.zeros(len(names)))
+        particles = len(checkpoint["positions"]) - len(system.positions)
+        if particles:
+            system.add_particles(np.zeros((particles, 3)), np.zeros((particles, 3)))
+        system.restore_checkpoint(checkpoint)
+        system.reset_keyframes()
+        return system
 
     def get_date(self):
-        return self.date.strftime("%Y-%m-%d (%Hh)")
+        return julian.format_date(self.julian_date(), with_hour=True)
 
     def dump_state(self):
         current_date = self.get_date()
@@ -110,8 +505,6 @@ class SolarSystem:
                 "velocity": list(planet.velocity[:3])
             } for planet in self.planets]
         }
-        import os
         os.makedirs(os.path.dirname(f"output/{current_date}.json"), exist_ok=True)
         with open(f"output/{current_date}.json", "w") as f:
-            import json
             json.dump(data, f, indent=4)
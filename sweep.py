@@ -0,0 +1,101 @@
+"""
+Parallel sweeps of headless runs over a grid of start dates, dt values and integrators
+"""
+
+import itertools
+import julian
+import multiprocessing
+import os
+import sys
+import time
+from propagate import propagate
+
+
+def monthly_dates(start_date: str, end_date: str, months=1) -> list[str]:
+    """ Dates from start_date up to and including end_date, every given number of months """
+    year, month, day, _ = julian.calendar_date(julian.parse_date(start_date))
+    end = julian.parse_date(end_date)
+    dates = []
+    while julian.julian_date(year, month, day) <= end:
+        dates.append(julian.format_date(julian.julian_date(year, month, day)))
+        month += months
+        year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return dates
+
+
+def make_jobs(start_dates, dts, integrators, days: int, cadence=24) -> list[dict]:
+    """ Cartesian product of the sweep parameters, one job per (start_date, dt, integrator) """
+    return [{"start_date": start_date, "dt": dt, "integrator": integrator, "days": days, "cadence": cadence}
+            for start_date, dt, integrator in itertools.product(start_dates, dts, integrators)]
+
+
+def job_output(job: dict, output_dir: str) -> str:
+    return os.path.join(output_dir, f"{job['start_date']}_{job['dt']}h_{job['integrator']}_{job['days']}d.bin")
+
+
+def run_job(args) -> tuple[dict, float]:
+    """ Run a single job, writing into a temporary file that is renamed only once the run is complete """
+    job, output_dir = args
+    output = job_output(job, output_dir)
+    end_date = julian.format_date(julian.parse_date(job["start_date"]) + job["days"])
+    began = time.perf_counter()
+    propagate(job["start_date"], end_date, job["dt"], job["cadence"], output + ".part", job["integrator"])
+    os.replace(output + ".part", output)
+    return job, time.perf_counter() - began
+
+
+def run_sweep(jobs: list[dict], output_dir="output/sweep", workers=None, chunksize=1) -> int:
+    """ Distribute jobs over a process pool, skipping the ones whose output already exists. Returns jobs run. """
+    os.makedirs(output_dir, exist_ok=True)
+    pending = [job for job in jobs if not os.path.exists(job_output(job, output_dir))]
+    print(f"{len(jobs) - len(pending)} of {len(jobs)} jobs already completed")
+    if not pending:
+        return 0
+    with multiprocessing.Pool(workers) as pool:
+        tasks = [(job, output_dir) for job in pending]
+        for done, (job, elapsed) in enumerate(pool.imap_unordered(run_job, tasks, chunksize), start=1):
+            print(f"[{done}/{len(pending)}] {os.path.basename(job_output(job, output_dir))} in {elapsed:.2f}s")
+    return len(pending)
+
+
+def main():
+    start_date = "1800-01-01"
+    end_date = "2050-01-01"
+    months = 1
+    dts = [24]
+    integrators = ["rk4"]
+    days = 365
+    cadence = 24
+    output_dir = "output/sweep"
+    workers = None
+    chunksize = 1
+
+    for i in sys.argv[1:]:
+        arg, *val = i.split("=")
+        if arg == "--start":
+            start_date = val[0]
+        if arg == "--end":
+            end_date = val[0]
+        if arg == "--months":
+            months = int(val[0])
+        if arg == "--dt":
+            dts = [int(dt) for dt in val[0].split(",")]
+        if arg == "--integrator":
+            integrators = val[0].split(",")
+        if arg == "--days":
+            days = int(val[0])
+        if arg == "--cadence":
+            cadence = int(val[0])
+        if arg == "--output":
+            output_dir = val[0]
+        if arg == "--workers":
+            workers = int(val[0])
+        if arg == "--chunksize":
+            chunksize = int(val[0])
+
+    jobs = make_jobs(monthly_dates(start_date, end_date, months), dts, integrators, days, cadence)
+    run_sweep(jobs, output_dir, workers, chunksize)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Binary trajectory files: a small JSON header followed by fixed-size float64 records, one per snapshot.
+Each record holds the Julian date followed by positions and velocities of all bodies, (N, 6) row-major.
+"""
+
+import json
+import os
+import numpy as np
+import numpy.typing as npt
+
+MAGIC = b"SOLARPY\x01"
+ALIGNMENT = 64
+
+
+class TrajectoryWriter:
+    """ Buffers snapshots in memory and appends them to a single binary file in large blocks """
+
+    def __init__(self, path: str, names: list[str], chunk_size=4096, metadata: dict = None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.names = list(names)
+        self.record_size = 1 + 6 * len(self.names)
+        self.buffer = np.empty((chunk_size, self.record_size))
+        self.count = 0
+        self.file = open(path, "wb")
+
+        header = json.dumps({"names": self.names, "record_size": self.record_size, **(metadata or {})}).encode()
+        data_offset = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+        self.file.write(MAGIC)
+        self.file.write(np.array([len(header), data_offset], dtype="<u4").tobytes())
+        self.file.write(header.ljust(data_offset - len(MAGIC) - 8))
+
+    def append(self, time: float, positions: npt.NDArray[float], velocities: npt.NDArray[float]):
+        """ Add one snapshot, positions and velocities are (N, 3) arrays """
+        record = self.buffer[self.count]
+        record[0] = time
+        state = record[1:].reshape(-1, 6)
+        state[:, :3] = positions
+        state[:, 3:] = velocities
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def write(self, system):
+        """ Add the current state of the planets of a SolarSystem, followed by its test particles if named """
+        bodies = slice(1, len(self.names) + 1)
+        self.append(system.julian_date(), system.positions[bodies, :3], system.velocities[bodies, :3])
+
+    def flush(self):
+        self.file.write(self.buffer[:self.count].astype("<f8", copy=False).tobytes())
+        self.file.flush()
+        self.count = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trajectory:
+    """ Memory-mapped view of a binary trajectory file, slicing never parses or loads the whole file """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a SolarPy trajectory file")
+            header_len, data_offset = np.frombuffer(f.read(8), dtype="<u4")
+            self.header = json.loads(f.read(int(header_len)))
+        self.names = self.header["names"]
+        record_size = self.header["record_size"]
+        records = (os.path.getsize(path) - int(data_offset)) // (8 * record_size)
+        self.records = np.memmap(path, dtype="<f8", mode="r", offset=int(data_offset), shape=(records, record_size))
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def times(self) -> npt.NDArray[float]:
+        return self.records[:, 0]
+
+    @property
+    def states(self) -> npt.NDArray[float]:
+        """ (T, N, 6) positions and velocities """
+        return self.records[:, 1:].reshape(len(self.records), len(self.names), 6)
+
+    @property
+    def positions(self) -> npt.NDArray[float]:
+        return self.states[:, :, :3]
+
+    @property
+    def velocities(self) -> npt.NDArray[float]:
+        return self.states[:, :, 3:]
+
+    def between(self, start: float, end: float) -> slice:
+        """ Record slice covering Julian dates start <= t <= end (records are in chronological order) """
+        return slice(int(np.searchsorted(self.times, start, "left")), int(np.searchsorted(self.times, end, "right")))